@@ -1,53 +1,150 @@
 """Recent Earthquakes Dashboard - Main Application."""
-import matplotlib.pyplot as plt
-import numpy as np
+# Imported first: this starts loading the dataset in the background
+import shared
+from shared import app_dir, current_dataset
 
 from shiny import reactive, render
 from shiny import ui as ui_module
 from shiny.express import input, ui
 from shinywidgets import render_plotly
 
-from shared import app_dir, earthquakes
+from cache import cached_figure, cached_rows, figure_from_json, result_cache
 from components import ICONS
-from map import build_earthquake_map
-from outliers import build_outliers_infographic
+from config import DATA_POLL_SECS, FILTER_DEBOUNCE_MS, MAP_AGGREGATE_THRESHOLD, MAP_CELL_DEGREES, METRICS_ENABLED, TS_RENDERER
+from filter_index import normalize_filter
+from instrumentation import instrument, metrics, start_metrics_server
+from map import MAP_COLUMNS, build_earthquake_density_map, build_earthquake_map, set_plate_detail
+from outliers import build_outliers_infographic, build_top_list
 from scatterplot import build_scatterplot
 from seasonal import build_monthly_chart
-from heatmap import build_mag_depth_heatmap
+from heatmap import build_mag_depth_heatmap_from_counts
+from ingest import start_feed
 from scatter_matrix import build_scatterplot_matrix
-from timeseries import build_time_series_gif
-from shinywidgets import render_plotly
-from shinywidgets import render_widget
+from render_pool import figure_json, run_in_pool, warm as warm_render_pool
+from scheduling import debounce, prioritize
+from table import PAGE_SIZES, page_count
+from timeseries import PLOTLY_JS, build_time_series_figure, build_time_series_gif_async
 
-from shared import app_dir, earthquakes
-from shiny import reactive, render
-from shiny.express import input, ui
-from shiny.ui import showcase_left_center
+# Start the render processes with the app rather than on the first render
+warm_render_pool()
+start_metrics_server()
+
+# Waits for the background load started above. Used to build the page;
+# outputs read the latest data through dataset()
+from shared import earthquakes  # noqa: E402
+
+start_feed()
 
 mag_rng = (earthquakes.magnitude.min(), earthquakes.magnitude.max())
 depth_rng = (earthquakes.depth.min(), earthquakes.depth.max())
 raw_columns = earthquakes.columns.tolist()
 mag_types = earthquakes.magType.unique().tolist()[:5]
 
+@reactive.poll(lambda: shared.data_version, DATA_POLL_SECS)
+def dataset():
+    """The current Dataset; outputs refresh when events are appended (see ingest.py)."""
+    return current_dataset()
+
+
+@debounce(FILTER_DEBOUNCE_MS / 1000)
+def filter_key():
+    """Normalized filter tuple, shared as a cache key across sessions.
+
+    Debounced, so dragging a slider only refilters once the drag pauses.
+    """
+    return normalize_filter(input.magnitude(), input.depth(), input.mag_type())
+
+
+@reactive.calc
+def cache_key():
+    """filter_key() qualified by the data version, for the cross-session cache."""
+    return (dataset().version, filter_key())
+
+
+@reactive.calc
+def filtered_rows():
+    """Row positions of the earthquakes matching the user's filters."""
+    index = dataset().filter_index
+    key = filter_key()
+    return cached_rows(cache_key(), lambda: index.query(*key))
+
+
+def _rows_in():
+    return len(filtered_rows())
+
+
 @reactive.calc
+@instrument("earthquake_data", rows=_rows_in)
 def earthquake_data():
     """Filter earthquake data based on user inputs."""
-    mag = input.magnitude()
-    depth = input.depth()
-    idx1 = earthquakes.magnitude.between(mag[0], mag[1])
-    idx2 = earthquakes.depth.between(depth[0], depth[1])
-    idx3 = earthquakes.magType.isin(input.mag_type())
-    return earthquakes[idx1 & idx2 & idx3]
+    return dataset().earthquakes.take(filtered_rows())
+
+
+@reactive.extended_task
+@instrument("time_series_task", rows=_rows_in)
+async def time_series_task(data, aggregation, metric):
+    """Render the time-series GIF on the render pool."""
+    return await build_time_series_gif_async(data, aggregation, metric)
+
+
+@reactive.effect(priority=-20)
+def _start_time_series_task():
+    if TS_RENDERER == "plotly":
+        return
+    # A new filter or option supersedes the render in progress
+    time_series_task.cancel()
+    time_series_task(earthquake_data(), input.ts_aggregation(), input.ts_metric())
+
+
+@reactive.extended_task
+@instrument("map_task", rows=_rows_in)
+async def map_task(key, data, cells):
+    """Build the map figure JSON on the render pool, cached across sessions."""
+    fig_json = result_cache.get(("map", key))
+    if fig_json is None:
+        if cells is not None:
+            fig_json = await run_in_pool(figure_json, build_earthquake_density_map, cells)
+        else:
+            fig_json = await run_in_pool(figure_json, build_earthquake_map, data)
+        result_cache.put(("map", key), fig_json)
+    return fig_json
+
+
+@reactive.effect(priority=-10)
+def _start_map_task():
+    key = cache_key()
+    rows = filtered_rows()
+    map_task.cancel()
+    if len(rows) > MAP_AGGREGATE_THRESHOLD:
+        # Too many markers for the browser: show grid cells instead
+        map_task(key, None, dataset().filter_index.aggregate_grid(rows, MAP_CELL_DEGREES))
+    else:
+        map_task(key, earthquake_data()[MAP_COLUMNS], None)
 
 
 @reactive.effect
 @reactive.event(input.reset)
 def _reset_filters():
-    ui.update_slider("magnitude", value=mag_rng)
-    ui.update_slider("depth", value=depth_rng)
+    data = dataset().earthquakes
+    ui.update_slider("magnitude", value=_value_range(data.magnitude))
+    ui.update_slider("depth", value=_value_range(data.depth))
     ui.update_checkbox_group("mag_type", selected=mag_types)
 
 
+@reactive.effect
+@reactive.event(dataset, ignore_init=True)
+def _extend_slider_ranges():
+    """Let the sliders reach events added since the page was built."""
+    data = dataset().earthquakes
+    for name, column in (("magnitude", data.magnitude), ("depth", data.depth)):
+        lo, hi = _value_range(column)
+        ui.update_slider(name, min=lo, max=hi)
+
+
+def _value_range(column):
+    return (float(column.min()), float(column.max()))
+
+
 @reactive.effect
 @reactive.event(input.raw_select_all_btn)
 def _select_all_raw_columns():
@@ -66,6 +163,41 @@ def _update_raw_toggle_label():
     ui.update_action_button("raw_toggle", label=f"{len(sel)} of {len(raw_columns)} columns ▾")
 
 
+# Current page of the raw table (zero-based)
+raw_page = reactive.value(0)
+
+
+@reactive.calc
+def raw_positions():
+    """Row positions of the raw table in display order."""
+    sort = input.raw_sort() or None
+    rows = filtered_rows() if input.raw_apply_filter() else None
+    return dataset().table_pager.ordered_rows(sort, input.raw_sort_dir() == "asc", rows)
+
+
+@reactive.calc
+def raw_page_count():
+    return page_count(len(raw_positions()), int(input.raw_page_size()))
+
+
+@reactive.effect
+@reactive.event(raw_positions, input.raw_page_size)
+def _reset_raw_page():
+    raw_page.set(0)
+
+
+@reactive.effect
+@reactive.event(input.raw_prev_btn)
+def _raw_prev_page():
+    raw_page.set(max(raw_page() - 1, 0))
+
+
+@reactive.effect
+@reactive.event(input.raw_next_btn)
+def _raw_next_page():
+    raw_page.set(min(raw_page() + 1, raw_page_count() - 1))
+
+
 
 ui.page_opts(title="", fillable=False)
 
@@ -132,26 +264,75 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                             ui.input_select("ts_aggregation", None, ["Daily", "Weekly", "Monthly"], selected="Weekly")
                             ui.input_select("ts_metric", None, ["Average Magnitude", "Max Magnitude", "Earthquake Count"], selected="Earthquake Count")
                     with ui.card_body(style="height: 100%"):
-                        @render.ui
-                        def time_series_chart():
-                            gif_data = build_time_series_gif(earthquake_data(), input.ts_aggregation(), input.ts_metric())
-                            if gif_data:
-                                return ui_module.HTML(f'<img src="data:image/gif;base64,{gif_data}" style="max-width:100%; height:auto;" />')
-                            return ui_module.HTML("<p>Not enough data for time series</p>")
+                        if TS_RENDERER == "plotly":
+                            # Animated in the browser; plotly.js is linked once in the page head
+                            @prioritize(-20)
+                            @render.ui
+                            @instrument("time_series_chart", rows=_rows_in)
+                            def time_series_chart():
+                                fig = build_time_series_figure(earthquake_data(), input.ts_aggregation(), input.ts_metric())
+                                if fig is not None:
+                                    return ui_module.HTML(fig.to_html(include_plotlyjs=False, full_html=False,
+                                                                      auto_play=True, config={"displayModeBar": False}))
+                                return ui_module.HTML("<p>Not enough data for time series</p>")
+                        else:
+                            @prioritize(-20)
+                            @render.ui
+                            @instrument("time_series_chart", rows=_rows_in)
+                            def time_series_chart():
+                                gif_data = time_series_task.result()
+                                if gif_data:
+                                    return ui_module.HTML(f'<img src="data:image/gif;base64,{gif_data}" style="max-width:100%; height:auto;" />')
+                                return ui_module.HTML("<p>Not enough data for time series</p>")
           
                 # Earthquake Map
                 with ui.card(full_screen=True, style="min-height: 600px"):
                     with ui.card_header():
                         ui.h4("Earthquakes most often occur around tectonic plate boundaries", class_="mb-0", style="margin-bottom:0;margin-top:0;")
                     with ui.card_body(style="height: 100%"):
+                        # The GIF and the map are the slowest outputs, so they
+                        # are computed after everything else in a flush
+                        @prioritize(-10)
                         @render_plotly
+                        @instrument("earthquake_map", rows=_rows_in)
                         def earthquake_map():
-                            return build_earthquake_map(earthquake_data())
+                            return figure_from_json(map_task.result())
+
+                        @reactive.effect
+                        def _follow_map_zoom():
+                            """Swap in finer plate boundaries as the user zooms the map."""
+                            widget = earthquake_map.widget
+                            if widget is None:
+                                return
+
+                            def on_zoom(layout, zoom):
+                                if zoom is not None:
+                                    set_plate_detail(widget, zoom)
+                            widget.layout.on_change(on_zoom, "mapbox.zoom")
                 
                 # Outlier Earthquakes Infographic
                 ui.h4("The Outliers", class_="mb-0", style="margin-bottom:0;")
-                ui.p("The outlier earthquakes in the dataset", class_="mb-0 text-muted small", style="margin-top:-20px;margin-bottom:0;")
-                build_outliers_infographic(earthquakes)
+                ui.p("The outlier earthquakes matching the filters", class_="mb-0 text-muted small", style="margin-top:-20px;margin-bottom:0;")
+                @render.ui
+                @instrument("outliers_infographic", rows=_rows_in)
+                def outliers_infographic():
+                    data = dataset()
+                    return build_outliers_infographic(data.earthquakes, data.outlier_ranking, filtered_rows())
+
+                # Top-N list for the chosen measure
+                with ui.card(full_screen=True):
+                    with ui.card_header(class_="d-flex justify-content-between align-items-center"):
+                        ui.h4("Top earthquakes", class_="mb-0")
+                        with ui.div(class_="d-flex gap-2"):
+                            ui.input_select("top_by", None, {"magnitude": "Magnitude", "depth": "Depth", "felt": "Felt reports"})
+                            ui.input_numeric("top_n", None, 10, min=1, max=100, width="6rem")
+                    @render.ui
+                    @instrument("top_list", rows=_rows_in)
+                    def top_list():
+                        n = min(max(int(input.top_n() or 10), 1), 100)
+                        data = dataset()
+                        positions = data.outlier_ranking.top_k(input.top_by(), n, filtered_rows())
+                        return build_top_list(data.earthquakes, input.top_by(), positions)
 
                 # Monthly distribution chart
                 with ui.card(full_screen=True, style="min-height: 500px"):
@@ -161,8 +342,10 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                             ui.p("July–September account for nearly half of all recorded earthquakes", class_="mb-0 text-muted small")
                     with ui.card_body(style="height: 100%"):
                         @render_plotly
+                        @instrument("monthly_chart", rows=_rows_in)
                         def monthly_chart():
-                            return build_monthly_chart(earthquake_data())
+                            return cached_figure(("monthly", cache_key()),
+                                                 lambda: build_monthly_chart(earthquake_data()))
                         
                                   
                 # Scatter plot: Magnitude vs Depth
@@ -179,8 +362,11 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                             )
             
                     @render_plotly
+                    @instrument("scatterplot", rows=_rows_in)
                     def scatterplot():
-                        return build_scatterplot(earthquake_data(), input.scatter_color())
+                        color = input.scatter_color()
+                        return cached_figure(("scatter", cache_key(), color),
+                                             lambda: build_scatterplot(earthquake_data(), color))
                     
                 # Heatmap and Scatterplot Matrix side by side
                 with ui.div(style="display: flex; gap: 2rem; flex-wrap: wrap; justify-content: center; width: 100%;"):
@@ -190,8 +376,12 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                                 ui.h4("Most events are small to medium magnitude with shallow depth", class_="mb-0")
                         with ui.card_body(style="height: 100%"):
                             @render_plotly
+                            @instrument("mag_depth_heatmap", rows=_rows_in)
                             def mag_depth_heatmap():
-                                return build_mag_depth_heatmap(earthquake_data())
+                                cube = dataset().heatmap_cube
+                                key = filter_key()
+                                return cached_figure(("heatmap", cache_key()),
+                                                     lambda: build_mag_depth_heatmap_from_counts(cube.heatmap_data(*key)))
 
                     with ui.card(full_screen=True, style="width: 440px; height: 560px;"):
                         with ui.card_header():
@@ -199,8 +389,10 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                                 ui.h4("Pairwise relations between magnitude, depth, and felt reports", class_="mb-0")
                         with ui.card_body(style="height: 100%"):
                             @render_plotly
+                            @instrument("scatter_matrix_plot", rows=_rows_in)
                             def scatter_matrix_plot():
-                                return build_scatterplot_matrix(earthquake_data())
+                                return cached_figure(("splom", cache_key()),
+                                                     lambda: build_scatterplot_matrix(earthquake_data()))
                     
 
                 
@@ -208,7 +400,9 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
     with ui.nav_panel("Raw data"):
         with ui.card(full_screen=True):
             with ui.card_header(class_="d-flex justify-content-between align-items-center", style="position: relative;"):
-                "Raw data (unfiltered)"
+                with ui.div(class_="d-flex align-items-center gap-3"):
+                    "Raw data"
+                    ui.input_checkbox("raw_apply_filter", "Apply dashboard filters", value=False)
                 ui.input_action_button("raw_toggle",
                     f"{len(raw_columns)} of {len(raw_columns)} columns ▾",
                     class_="btn btn-link text-primary p-0")
@@ -225,10 +419,27 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                             ui.input_checkbox_group("raw_columns", None, choices=raw_columns, selected=raw_columns, inline=False),
                             style="max-height: 240px; width: 260px; overflow-y: auto;"))
 
+            with ui.div(class_="d-flex align-items-center gap-2 px-3 pt-2"):
+                ui.input_select("raw_sort", None, {"": "Original order", **{c: f"Sort by {c}" for c in raw_columns}}, width="14rem")
+                ui.input_select("raw_sort_dir", None, {"asc": "Ascending", "desc": "Descending"}, width="10rem")
+
             @render.data_frame
             def raw_table():
+                # Only the visible page is sent to the client
                 cols = list(input.raw_columns() or raw_columns)
-                return render.DataGrid(earthquakes[cols])
+                return render.DataGrid(dataset().table_pager.page(raw_positions(), cols, raw_page(), int(input.raw_page_size())))
+
+            with ui.card_footer(class_="d-flex align-items-center gap-2"):
+                ui.input_action_button("raw_prev_btn", "‹ Prev", class_="btn btn-sm btn-outline-secondary")
+                ui.input_action_button("raw_next_btn", "Next ›", class_="btn btn-sm btn-outline-secondary")
+                @render.text
+                def raw_page_label():
+                    n = len(raw_positions())
+                    size = int(input.raw_page_size())
+                    start = min(raw_page() * size + 1, n)
+                    end = min((raw_page() + 1) * size, n)
+                    return f"Rows {start:,}–{end:,} of {n:,} · page {raw_page() + 1} of {raw_page_count()}"
+                ui.input_select("raw_page_size", None, [str(size) for size in PAGE_SIZES], selected="50", width="6rem")
 
     with ui.nav_panel("Manual"):
         with ui.card(full_screen=False):
@@ -238,5 +449,21 @@ with ui.navset_bar(title="Recent Earthquakes", id="tabs"):
                 class_="btn btn-primary d-inline-flex align-items-center",
                 style="width: fit-content; padding: 0.35rem 0.9rem;")
 
+    if METRICS_ENABLED:
+        # Only present when EARTHQUAKE_METRICS is set
+        with ui.nav_panel("Admin"):
+            with ui.card(full_screen=True):
+                ui.card_header("Render timings for this worker")
+                ui.p("Per output since start-up. Times include the calcs an output triggered; "
+                     "the time-series and map tasks run on the render pool, so they have no CPU time.",
+                     class_="text-muted small px-3 pt-2 mb-0")
+
+                @render.data_frame
+                def admin_metrics():
+                    reactive.invalidate_later(2)
+                    return render.DataGrid(metrics.summary())
+
 # Include custom styles
 ui.include_css(app_dir / "styles.css")
+if TS_RENDERER == "plotly":
+    ui.head_content(ui.include_js(PLOTLY_JS))
@@ -0,0 +1,12 @@
+"""ASGI entry point for running the dashboard under uvicorn with several workers.
+
+    uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 8000
+
+Every worker imports shared.py, which memory-maps the processed dataset and
+index snapshots, so the data is held once in the page cache for all of them.
+"""
+from pathlib import Path
+
+from shiny.express import wrap_express_app
+
+app = wrap_express_app(Path(__file__).parent / "app.py")
@@ -0,0 +1 @@
+"""Offline performance benchmarks for the dashboard's chart builders and filters."""
@@ -0,0 +1,112 @@
+"""Check that the time-series GIF matches the original frame-by-frame renderer.
+
+    python -m benchmarks.gif_reference --sizes 1k,20k
+
+render_series_gif sets the figure up once and adds bars incrementally.
+reference_gif below is the renderer it replaced, which redraws every frame
+from scratch and round-trips it through PNG. For every aggregation and
+metric the two GIFs must be byte-identical; the script prints both times
+and exits with status 1 on any difference.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("EARTHQUAKE_OFFLINE", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from benchmarks.synthetic import make_catalog, parse_size  # noqa: E402
+from processing import prepare_earthquakes  # noqa: E402
+from timeseries import _frame_indices, render_series_gif, resample_series  # noqa: E402
+
+AGGREGATIONS = ("Daily", "Weekly", "Monthly")
+METRICS = ("Average Magnitude", "Max Magnitude", "Earthquake Count")
+
+
+def reference_gif(series, ylabel):
+    """Render a resampled series the original way: clear and redraw each frame."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from PIL import Image
+
+    dates = series.index.tolist()
+    values = series.values.tolist()
+    bar_width = (dates[-1] - dates[0]) / len(dates) * 0.8
+
+    frames = []
+    fig, ax = plt.subplots(figsize=(10, 4), dpi=80)
+    for idx in _frame_indices(len(dates)):
+        ax.clear()
+        ax.bar(dates[: idx + 1], values[: idx + 1], color="#3b82f6", width=bar_width)
+        if idx > 2:
+            window = min(5, idx + 1)
+            smoothed = np.convolve(values[: idx + 1], np.ones(window)/window, mode='same')
+            ax.plot(dates[: idx + 1], smoothed, color="#ef4444", linewidth=2.5, linestyle='-')
+        ax.set_xlim(dates[0], dates[-1])
+        ax.set_ylim(0, max(values) * 1.1)
+        ax.set_ylabel(ylabel)
+        ax.set_xlabel("Date")
+        ax.tick_params(axis="x", rotation=45)
+        plt.tight_layout()
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+        buf.seek(0)
+        frames.append(Image.open(buf).copy())
+        buf.close()
+    plt.close(fig)
+
+    gif_buf = io.BytesIO()
+    frames[0].save(gif_buf, format="GIF", save_all=True, append_images=frames[1:],
+                   duration=150, loop=0)
+    return gif_buf.getvalue()
+
+
+def check(earthquakes):
+    """Compare both renderers on every aggregation and metric; return the mismatches."""
+    mismatches = []
+    for aggregation in AGGREGATIONS:
+        for metric in METRICS:
+            series, ylabel = resample_series(earthquakes, aggregation, metric)
+            if series is None:
+                continue
+            start = time.perf_counter()
+            expected = reference_gif(series, ylabel)
+            reference_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            actual = render_series_gif(series, ylabel)
+            seconds = time.perf_counter() - start
+            same = actual == expected
+            print(f"  {aggregation:<8} {metric:<18} {len(series):>4} points  "
+                  f"reference {reference_seconds:5.2f} s  current {seconds:5.2f} s  "
+                  f"{'identical' if same else 'DIFFERENT'}")
+            if not same:
+                mismatches.append((aggregation, metric))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="1k,20k", help="comma-separated catalog sizes (default %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic catalogs")
+    args = parser.parse_args(argv)
+
+    mismatches = []
+    for size in args.sizes.split(","):
+        print(f"{size}:")
+        earthquakes = prepare_earthquakes(make_catalog(parse_size(size), args.seed))
+        mismatches += check(earthquakes)
+    if mismatches:
+        print(f"{len(mismatches)} GIF(s) differ from the reference renderer", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
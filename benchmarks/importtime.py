@@ -0,0 +1,118 @@
+"""Profile what the app imports at start-up, like python -X importtime.
+
+    python -m benchmarks.importtime --output startup.json
+    python -m benchmarks.importtime --baseline startup.json
+
+Imports the target module in a fresh interpreter with -X importtime and
+reports the total start-up time, the packages taking longest to import
+and any of LAZY_MODULES that were loaded. The default target, asgi, builds the whole app,
+so it needs the dataset: set EARTHQUAKE_CSV (and EARTHQUAKE_OFFLINE) to
+profile without downloading it. The render pool is disabled in the child,
+as its workers start in parallel with the app anyway.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+
+# Modules the app should only import when an output first needs them
+LAZY_MODULES = ("matplotlib", "plotly.express", "kagglehub")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+# Runs in the child; prints the wall time and which LAZY_MODULES got imported
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def profile(module):
+    """Import module in a fresh interpreter and return its import profile.
+
+    Returns:
+        Dict with the wall time of the import, the LAZY_MODULES it loaded
+        and one entry per imported module with self and cumulative
+        microseconds and nesting depth, in import order
+    """
+    script = _SCRIPT.format(module=module, lazy=LAZY_MODULES)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                            cwd=REPO, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONWARNINGS": "ignore",
+                                 # Pool workers would inherit -X importtime and mix in their imports
+                                 "EARTHQUAKE_RENDER_POOL_SIZE": "0"})
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({"module": name, "self_us": int(self_us),
+                            "cumulative_us": int(cumulative_us), "depth": len(indent) // 2})
+    timing = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"target": module, **timing, "modules": modules}
+
+
+def report(profile, top):
+    """Print the total time, lazily imported modules loaded and the slowest imports."""
+    print(f"import {profile['target']}: {profile['seconds']:.2f} s, {len(profile['modules'])} modules")
+    if profile["loaded"]:
+        print(f"  loaded at start-up, should be lazy: {', '.join(profile['loaded'])}")
+    # Top-level packages only, so nested imports aren't counted twice
+    packages = {}
+    for entry in profile["modules"]:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + entry["self_us"]
+    print(f"  {'package':<28} {'self ms':>9}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<28} {self_us / 1000:9.1f}")
+
+
+def compare(current, baseline, tolerance):
+    """Print the start-up time against a baseline; return True if it regressed."""
+    ratio = current["seconds"] / baseline["seconds"] if baseline["seconds"] else float("inf")
+    print(f"baseline {baseline['seconds']:.2f} s, current {current['seconds']:.2f} s, {ratio:.2f}x")
+    new = sorted(set(current["loaded"]) - set(baseline["loaded"]))
+    if new:
+        print(f"newly imported at start-up: {', '.join(new)}")
+    return ratio > 1 + tolerance or bool(new)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--module", default="asgi", help="module to import (default %(default)s)")
+    parser.add_argument("--top", type=int, default=20, help="packages to list (default 20)")
+    parser.add_argument("--output", type=Path, help="write the profile as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="compare against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown ratio above 1 counted as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    result = profile(args.module)
+    result["meta"] = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    report(result, args.top)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, indent=2))
+    if args.baseline and compare(result, json.loads(args.baseline.read_text()), args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
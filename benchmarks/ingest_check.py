@@ -0,0 +1,86 @@
+"""Check that appending events to a snapshot keeps its dtypes and values.
+
+    python -m benchmarks.ingest_check --sizes 1k,100k
+
+Each synthetic catalog is snapshotted without its last rows, which are then
+appended in batches the way ingest.append_events does it: processed on
+their own and written with snapshot.append_snapshot. Every column must keep
+the dtype it was snapshotted with (appending only writes the batch unless
+a value doesn't fit) and the values must match processing the whole
+catalog at once. The script exits with status 1 on any difference.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("EARTHQUAKE_OFFLINE", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import make_catalog, parse_size  # noqa: E402
+from processing import prepare_earthquakes, process_earthquakes  # noqa: E402
+from snapshot import append_snapshot, load_snapshot, save_snapshot  # noqa: E402
+
+# Share of each catalog appended after the snapshot is taken, and batch size
+APPENDED_FRACTION = 0.1
+BATCH_ROWS = 200
+
+
+def check(raw):
+    """Snapshot raw without its tail, append the tail and return the differing columns."""
+    # append_events drops ids already in the snapshot; there are none here
+    raw = raw.drop_duplicates(subset=["id"], ignore_index=True)
+    split = len(raw) - max(1, int(APPENDED_FRACTION * len(raw)))
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "snapshot")
+        save_snapshot(prepare_earthquakes(raw.iloc[:split].copy()), directory)
+        dtypes = load_snapshot(directory).dtypes
+        start = time.perf_counter()
+        for at in range(split, len(raw), BATCH_ROWS):
+            append_snapshot(directory, process_earthquakes(raw.iloc[at:at + BATCH_ROWS].copy()))
+        seconds = time.perf_counter() - start
+        data = load_snapshot(directory)
+        expected = prepare_earthquakes(raw.copy())
+
+        changed = [name for name in dtypes.index if data[name].dtype != dtypes[name]]
+        different = [name for name in expected.columns if not _same_values(data[name], expected[name])]
+        print(f"  appended {len(raw) - split} rows in {seconds:.3f} s")
+        for name in changed:
+            print(f"  {name}: dtype {dtypes[name]} became {data[name].dtype}")
+        for name in different:
+            print(f"  {name}: values differ")
+        return sorted(set(changed) | set(different))
+
+
+def _same_values(column, expected):
+    """Whether two columns hold the same values, whatever their dtypes; missing values match."""
+    if len(column) != len(expected):
+        return False
+    column = column.to_numpy(dtype=object)
+    expected = expected.to_numpy(dtype=object)
+    return bool(np.all((column == expected) | (pd.isna(column) & pd.isna(expected))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="1k,100k", help="comma-separated catalog sizes (default %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic catalogs")
+    args = parser.parse_args(argv)
+
+    mismatches = []
+    for size in args.sizes.split(","):
+        print(f"{size}:")
+        mismatches += check(make_catalog(parse_size(size), args.seed))
+    if mismatches:
+        print(f"{len(mismatches)} column(s) changed by appending", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
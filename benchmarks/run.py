@@ -0,0 +1,246 @@
+"""Time the chart builders and the filter path on synthetic catalogs.
+
+    python -m benchmarks.run --sizes 1k,100k --output results.json
+    python -m benchmarks.run --sizes 1k,100k --baseline results.json
+
+For each catalog size every benchmark is run once under tracemalloc for its
+peak memory, which also warms it up, and then timed over --repeat runs.
+Figure benchmarks include serializing the figure to JSON, as the app's
+figure cache does, and report the payload size. Builders get the whole
+catalog (the unfiltered dashboard, their worst case); the filter benchmarks
+use a typical slider setting.
+
+Everything runs offline: the catalogs are generated, and the map uses the
+bundled plate boundaries, so run bundle_plates.py once before benchmarking it.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Never touch the network; must be set before the app modules read config
+os.environ.setdefault("EARTHQUAKE_OFFLINE", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import plotly  # noqa: E402
+
+from benchmarks.synthetic import make_catalog, parse_size  # noqa: E402
+from config import MAP_AGGREGATE_THRESHOLD, MAP_CELL_DEGREES, PLATES_FILE  # noqa: E402
+from cube import CategoryCube  # noqa: E402
+from filter_index import FilterIndex, normalize_filter  # noqa: E402
+from heatmap import build_mag_depth_heatmap, build_mag_depth_heatmap_from_counts  # noqa: E402
+from map import build_earthquake_density_map, build_earthquake_map  # noqa: E402
+from processing import prepare_earthquakes  # noqa: E402
+from ranking import OutlierRanking  # noqa: E402
+from relation_graph import build_relation_graph  # noqa: E402
+from scatter_matrix import build_scatterplot_matrix  # noqa: E402
+from scatterplot import build_scatterplot  # noqa: E402
+from seasonal import build_monthly_chart  # noqa: E402
+from timeseries import build_time_series_figure, render_series_gif, resample_series  # noqa: E402
+
+DEFAULT_SIZES = "1k,100k"
+# Slider setting used by the filter benchmarks
+FILTER = ((4.0, 7.0), (0.0, 300.0))
+
+
+def build_context(n, seed):
+    """Generate and process a catalog and build the app's indexes over it."""
+    context = {"raw": make_catalog(n, seed)}
+    context["earthquakes"] = prepare_earthquakes(context["raw"].copy())
+    earthquakes = context["earthquakes"]
+    context["mag_types"] = earthquakes.magType.unique().dropna().tolist()[:5]
+    context["key"] = normalize_filter(*FILTER, context["mag_types"])
+    context["filter_index"] = FilterIndex(earthquakes)
+    context["cube"] = CategoryCube(earthquakes, context["filter_index"])
+    context["ranking"] = OutlierRanking(earthquakes)
+    return context
+
+
+def _filter_mask(ctx):
+    # The app's original filter, kept as the reference for filter.index
+    earthquakes = ctx["earthquakes"]
+    (mag_lo, mag_hi), (depth_lo, depth_hi) = FILTER
+    mask = (earthquakes.magnitude.between(mag_lo, mag_hi)
+            & earthquakes.depth.between(depth_lo, depth_hi)
+            & earthquakes.magType.isin(ctx["mag_types"]))
+    return earthquakes[mask]
+
+
+def _filter_index(ctx):
+    return ctx["earthquakes"].take(ctx["filter_index"].query(*ctx["key"]))
+
+
+def _map(ctx):
+    # Same choice as the app: grid cells above MAP_AGGREGATE_THRESHOLD events
+    earthquakes = ctx["earthquakes"]
+    if len(earthquakes) > MAP_AGGREGATE_THRESHOLD:
+        rows = np.arange(len(earthquakes))
+        cells = ctx["filter_index"].aggregate_grid(rows, MAP_CELL_DEGREES)
+        return build_earthquake_density_map(cells).to_json()
+    return build_earthquake_map(earthquakes).to_json()
+
+
+def _time_series_gif(ctx):
+    # Renders directly, bypassing the GIF caches
+    series, ylabel = resample_series(ctx["earthquakes"], "Weekly", "Earthquake Count")
+    return render_series_gif(series, ylabel)
+
+
+def _top_k(ctx):
+    rows = ctx["filter_index"].query(*ctx["key"])
+    return [ctx["ranking"].top_k(column, 10, rows) for column in ("magnitude", "depth", "felt")]
+
+
+# name -> function of the context; strings/bytes returned are payload sizes
+BENCHMARKS = {
+    "load.process": lambda ctx: prepare_earthquakes(ctx["raw"].copy()),
+    "index.filter": lambda ctx: FilterIndex(ctx["earthquakes"]),
+    "index.cube": lambda ctx: CategoryCube(ctx["earthquakes"], ctx["filter_index"]),
+    "index.ranking": lambda ctx: OutlierRanking(ctx["earthquakes"]),
+    "filter.mask": _filter_mask,
+    "filter.index": _filter_index,
+    "outliers.top_k": _top_k,
+    "map": _map,
+    "time_series.gif": _time_series_gif,
+    "time_series.plotly": lambda ctx: build_time_series_figure(
+        ctx["earthquakes"], "Weekly", "Earthquake Count").to_json(),
+    "monthly": lambda ctx: build_monthly_chart(ctx["earthquakes"]).to_json(),
+    "heatmap.frame": lambda ctx: build_mag_depth_heatmap(ctx["earthquakes"]).to_json(),
+    "heatmap.cube": lambda ctx: build_mag_depth_heatmap_from_counts(
+        ctx["cube"].heatmap_data(*ctx["key"])).to_json(),
+    "scatter": lambda ctx: build_scatterplot(ctx["earthquakes"], "magType").to_json(),
+    "scatter_matrix": lambda ctx: build_scatterplot_matrix(ctx["earthquakes"]).to_json(),
+    "relation_graph": lambda ctx: build_relation_graph(ctx["earthquakes"]).to_json(),
+}
+
+
+def run_benchmark(fn, ctx, repeat):
+    """Measure fn(ctx)'s peak traced memory once, then time it repeat times.
+
+    The traced run comes first and doubles as the warm-up for the timings.
+    """
+    tracemalloc.start()
+    try:
+        output = fn(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    output_bytes = len(output) if isinstance(output, (str, bytes)) else None
+    del output
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(ctx)
+        times.append(time.perf_counter() - start)
+    return {
+        "seconds": statistics.median(times),
+        "min_seconds": min(times),
+        "peak_bytes": peak,
+        "output_bytes": output_bytes,
+    }
+
+
+def run(sizes, repeat, selected, seed):
+    """Run the selected benchmarks at every size and return the results document."""
+    results = []
+    for size in sizes:
+        n = parse_size(size)
+        start = time.perf_counter()
+        ctx = build_context(n, seed)
+        print(f"{size}: {len(ctx['earthquakes']):,} events after processing "
+              f"(setup {time.perf_counter() - start:.1f}s)", file=sys.stderr)
+        for name in selected:
+            result = run_benchmark(BENCHMARKS[name], ctx, repeat)
+            result.update(size=size, rows=n, benchmark=name)
+            results.append(result)
+            print(f"  {name:<20} {_format_seconds(result['seconds']):>10} "
+                  f"peak {result['peak_bytes'] / 2**20:8.1f} MiB", file=sys.stderr)
+        del ctx
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "plotly": plotly.__version__,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print timing ratios against a baseline; return the regressed entries."""
+    base = {(r["size"], r["benchmark"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"{'size':>6} {'benchmark':<20} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in current["results"]:
+        old = base.get((result["size"], result["benchmark"]))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  SLOWER"
+            regressions.append(result)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"{result['size']:>6} {result['benchmark']:<20} {_format_seconds(old['seconds']):>10} "
+              f"{_format_seconds(result['seconds']):>10} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def _format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma-separated catalog sizes, e.g. 1k,100k,1m,10m (default %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (default 3)")
+    parser.add_argument("--only", help="comma-separated benchmark names to run (default all)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic catalogs")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="compare against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown ratio above 1 counted as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+    if "map" in selected and not PLATES_FILE.is_file():
+        parser.error(f"the map benchmark needs the plate boundaries in {PLATES_FILE}; "
+                     "run bundle_plates.py first or leave it out with --only")
+
+    results = run(args.sizes.split(","), args.repeat, selected, args.seed)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than the baseline", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
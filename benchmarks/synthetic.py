@@ -0,0 +1,108 @@
+"""Synthetic earthquake catalogs with the Kaggle CSV's schema.
+
+The values roughly follow the real catalog (a long-tailed magnitude
+distribution, mostly shallow depths, a few dominant magType values) so the
+filters and charts do realistic amounts of work. Text columns are plain
+object columns with one string object per row, as read_csv returns them,
+so load.process includes the conversion to categoricals. Only the text
+columns the app drops untouched share a single string object, to keep
+10M-row catalogs within memory.
+"""
+import numpy as np
+import pandas as pd
+
+MAG_TYPES = ["mb", "mww", "ml", "md", "mwr", "mb_lg", "mi"]
+MAG_TYPE_WEIGHTS = [0.4, 0.2, 0.15, 0.1, 0.1, 0.03, 0.02]
+NETS = ["us", "ak", "nc", "ci", "hv"]
+ALERTS = ["green", "yellow", "orange", "red"]
+CONTINENTS = ["Asia", "Europe", "Oceania", "North America", "South America"]
+COUNTRIES = ["Japan", "Chile", "Indonesia", "United States", "Papua New Guinea", "Tonga"]
+
+# Start and end of the synthetic catalog, in milliseconds since epoch
+TIME_RANGE = (1_690_000_000_000, 1_722_000_000_000)
+
+# Text columns the app drops right after loading; each holds a single value
+_DROPPED_CONSTANTS = {
+    "type": "earthquake", "url": "https://earthquake.usgs.gov",
+    "detailUrl": "https://earthquake.usgs.gov", "status": "reviewed", "code": "000",
+    "sources": ",us,", "types": ",origin,", "geometryType": "Point",
+    "placeOnly": "", "location": "", "locality": "", "postcode": "",
+    "what3words": "", "locationDetails": "[]",
+}
+
+
+def parse_size(text):
+    """Parse a catalog size such as '100k' or '10m'."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def make_catalog(n, seed=0):
+    """Return a raw catalog frame with n rows, as read from the Kaggle CSV."""
+    rng = np.random.default_rng(seed)
+    time = rng.integers(*TIME_RANGE, n)
+    places = np.array([f"{k} km {d} of Town{j}" for k in range(1, 50, 7)
+                       for d in ("N", "S", "E", "W") for j in range(150)])
+
+    columns = {
+        "id": _strings(np.char.add("bm", np.arange(n).astype(str))),
+        "magnitude": np.round(rng.gamma(2.0, 0.6, n) + 2.5, 2),
+        "title": _text(n, "M 4.5"),
+        "date": _text(n, "2024-01-01T00:00:00"),
+        "time": time,
+        "felt": np.where(rng.random(n) < 0.5, np.nan, rng.integers(0, 5000, n)),
+        "cdi": rng.random(n) * 9,
+        "mmi": rng.random(n) * 9,
+        "alert": _choice(rng, ALERTS, n, missing=0.9),
+        "tsunami": rng.integers(0, 2, n),
+        "sig": rng.integers(0, 1000, n),
+        "net": _choice(rng, NETS, n),
+        "ids": _text(n, ",us0001,"),
+        "nst": rng.integers(0, 300, n).astype(float),
+        "dmin": rng.random(n),
+        "gap": rng.random(n) * 180,
+        "magType": _strings(np.array(MAG_TYPES)[rng.choice(len(MAG_TYPES), n, p=MAG_TYPE_WEIGHTS)]),
+        "depth": np.round(np.abs(rng.lognormal(3, 1.2, n)).clip(0, 690), 3),
+        "latitude": rng.uniform(-70, 70, n),
+        "longitude": rng.uniform(-180, 180, n),
+        "place": _strings(places[rng.integers(0, len(places), n)]),
+        "distanceKM": rng.integers(0, 300, n),
+        "continent": _choice(rng, CONTINENTS, n),
+        "country": _choice(rng, COUNTRIES, n),
+        "subnational": _text(n, ""),
+        "city": _text(n, ""),
+        "timezone": np.zeros(n, dtype=np.int64),
+    }
+    columns["updated"] = time
+    columns["rms"] = rng.random(n)
+    for name, value in _DROPPED_CONSTANTS.items():
+        columns[name] = _constant(n, value)
+    frame = pd.DataFrame(columns)
+    # A few duplicated ids, which the pipeline drops
+    frame.loc[rng.random(n) < 0.001, "id"] = "bm0"
+    return frame
+
+
+def _strings(values):
+    """Object column with a separate str object per row, like read_csv's."""
+    return values.astype(object)
+
+
+def _text(n, value):
+    """Text column repeating one value, with a str object per row."""
+    return _strings(np.full(n, value))
+
+
+def _choice(rng, values, n, missing=0.0):
+    """Text column of random values, NaN with probability missing."""
+    column = _strings(np.array(values)[rng.integers(0, len(values), n)])
+    column[rng.random(n) < missing] = np.nan
+    return column
+
+
+def _constant(n, value):
+    """Column of a dropped constant; one shared str object, which the app never reads."""
+    column = np.empty(n, dtype=object)
+    column[:] = value
+    return column
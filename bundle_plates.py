@@ -0,0 +1,53 @@
+"""Download the PB2002 plate boundaries and write the compact bundled copy.
+
+Run this once where the network is available (the Dockerfile does it at
+build time) so the app can start without fetching anything:
+
+    python bundle_plates.py [output.json.gz]
+"""
+import gzip
+import json
+import sys
+from pathlib import Path
+
+from config import PLATES_FILE
+from helpers import fetch_tectonic_plates
+
+# ~100 m precision, far below what the map can show
+COORD_DECIMALS = 3
+
+
+def compact_plates(plates):
+    """Keep only the line geometries, with rounded coordinates."""
+    features = []
+    for feature in plates.get("features", []):
+        geometry = feature["geometry"]
+        if geometry["type"] == "LineString":
+            coords = [[round(x, COORD_DECIMALS), round(y, COORD_DECIMALS)]
+                      for x, y, *_ in geometry["coordinates"]]
+        elif geometry["type"] == "MultiLineString":
+            coords = [[[round(x, COORD_DECIMALS), round(y, COORD_DECIMALS)] for x, y, *_ in line]
+                      for line in geometry["coordinates"]]
+        else:
+            continue
+        features.append({
+            "type": "Feature",
+            "properties": {"Name": feature.get("properties", {}).get("Name")},
+            "geometry": {"type": geometry["type"], "coordinates": coords},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main(argv):
+    out = Path(argv[1]) if len(argv) > 1 else PLATES_FILE
+    plates = fetch_tectonic_plates()
+    if not plates["features"]:
+        sys.exit("No plate boundaries downloaded")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(out, "wt") as f:
+        json.dump(compact_plates(plates), f, separators=(",", ":"))
+    print(f"Wrote {len(plates['features'])} features to {out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,182 @@
+"""Process-wide LRU cache shared by every Shiny session in a worker."""
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import plotly.graph_objects as go
+
+from config import RESULT_CACHE_MB
+from instrumentation import record_cache, record_payload
+
+
+def sizeof(value):
+    """Approximate memory held by a cached value, in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Keys are tuples whose first element names the kind of entry (e.g.
+    ``("rows", filter)`` or ``("map", filter)``); hit and miss counts are
+    kept per kind.
+    """
+
+    def __init__(self, max_bytes, sizeof=sizeof):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+        self._evictions = 0
+
+    def get(self, key, default=None):
+        """Return the value for key, marking it most recently used."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits[key[0]] += 1
+                record_cache(True)
+                return self._entries[key][0]
+            self._misses[key[0]] += 1
+            record_cache(False)
+            return default
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries to stay in budget."""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drop every entry (statistics are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters per key kind plus current usage."""
+        with self._lock:
+            kinds = sorted(set(self._hits) | set(self._misses))
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "hits": sum(self._hits.values()),
+                "misses": sum(self._misses.values()),
+                "by_kind": {k: {"hits": self._hits[k], "misses": self._misses[k]} for k in kinds},
+            }
+
+
+class DiskCache:
+    """Size-bounded directory of binary blobs keyed by content hash.
+
+    Used as a second tier behind an LRUCache so renders survive restarts and
+    are shared by workers on the same host. Least recently written files are
+    removed once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=".bin"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        """Return the stored bytes for key, or None."""
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """Store bytes for key atomically, then prune the directory to budget."""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._prune()
+        except OSError as e:
+            print(f"Could not write cache file for {key}: {e}")
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+# Filtered row positions and serialized figures, keyed by the normalized filter
+result_cache = LRUCache(RESULT_CACHE_MB * 1024 * 1024)
+
+
+def cached_rows(key, compute):
+    """Return filtered row positions for key; cached arrays are read-only."""
+    def compute_frozen():
+        rows = compute()
+        rows.setflags(write=False)
+        return rows
+    return result_cache.get_or_compute(("rows", key), compute_frozen)
+
+
+def cached_figure(key, build):
+    """Return a Plotly figure for key, building it with build() on a miss.
+
+    Only the figure JSON is stored, so every session gets its own figure
+    object and can't mutate another session's copy.
+    """
+    fig_json = result_cache.get_or_compute(key, lambda: build().to_json())
+    return figure_from_json(fig_json)
+
+
+def figure_from_json(fig_json):
+    """Rebuild a figure from JSON produced by Figure.to_json()."""
+    record_payload(len(fig_json))
+    # The JSON came from a validated figure, so skip re-validating it
+    return go.Figure(json.loads(fig_json), _validate=False)
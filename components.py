@@ -1,11 +1,35 @@
 """Reusable UI components for the dashboard."""
-import faicons as fa
+from collections.abc import Mapping
 
-
-ICONS = {
-    "earth": fa.icon_svg("earth-americas"),
-    "gauge": fa.icon_svg("gauge-high"),
-    "arrows": fa.icon_svg("arrows-down-to-people"),
-    "ellipsis": fa.icon_svg("ellipsis"),
-    "chevron": fa.icon_svg("chevron-down"),
+# Icon key -> Font Awesome icon name
+ICON_NAMES = {
+    "earth": "earth-americas",
+    "gauge": "gauge-high",
+    "arrows": "arrows-down-to-people",
+    "ellipsis": "ellipsis",
+    "chevron": "chevron-down",
 }
+
+
+class LazyIcons(Mapping):
+    """Mapping of icon keys to SVGs, each rendered on first access."""
+
+    def __init__(self, names):
+        self._names = names
+        self._svgs = {}
+
+    def __getitem__(self, key):
+        svg = self._svgs.get(key)
+        if svg is None:
+            import faicons as fa
+            svg = self._svgs[key] = fa.icon_svg(self._names[key])
+        return svg
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+
+ICONS = LazyIcons(ICON_NAMES)
@@ -0,0 +1,88 @@
+"""Runtime settings for the earthquake dashboard, read from environment variables."""
+import os
+from pathlib import Path
+
+app_dir = Path(__file__).parent
+
+
+def _env_flag(name, default=False):
+    """Read a boolean flag such as EARTHQUAKE_SNAPSHOT=0 from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Directory holding processed dataset snapshots
+CACHE_DIR = Path(os.environ.get("EARTHQUAKE_CACHE_DIR", app_dir / ".cache"))
+
+# Reuse the processed snapshot between starts (set to 0 to always rebuild)
+SNAPSHOT_ENABLED = _env_flag("EARTHQUAKE_SNAPSHOT", True)
+
+# Print per-column memory use of the frame before and after dtype compaction
+MEMORY_REPORT = _env_flag("EARTHQUAKE_MEMORY_REPORT")
+
+# Offline mode: never touch the network. Requires EARTHQUAKE_CSV and uses
+# the bundled plate boundaries only.
+OFFLINE = _env_flag("EARTHQUAKE_OFFLINE")
+
+# Local earthquakes CSV to use instead of downloading it from Kaggle
+DATASET_CSV = os.environ.get("EARTHQUAKE_CSV")
+
+# Pre-packaged tectonic plate boundaries (written by bundle_plates.py)
+PLATES_FILE = Path(os.environ.get("EARTHQUAKE_PLATES_FILE",
+                                  app_dir / "data" / "PB2002_boundaries.json.gz"))
+PLATES_URL = "https://raw.githubusercontent.com/fraxen/tectonicplates/master/GeoJSON/PB2002_boundaries.json"
+PLATES_TIMEOUT = float(os.environ.get("EARTHQUAKE_PLATES_TIMEOUT", "10"))
+
+# Memory budget of the cross-session cache for filtered rows and figures
+RESULT_CACHE_MB = float(os.environ.get("EARTHQUAKE_RESULT_CACHE_MB", "256"))
+
+# Memory budget for rendered time-series GIFs, plus an optional on-disk tier
+GIF_CACHE_MB = float(os.environ.get("EARTHQUAKE_GIF_CACHE_MB", "64"))
+GIF_CACHE_DIR = os.environ.get("EARTHQUAKE_GIF_CACHE_DIR")
+GIF_DISK_CACHE_MB = float(os.environ.get("EARTHQUAKE_GIF_DISK_CACHE_MB", "512"))
+
+# How the time-series card is animated: "gif" renders frames on the server,
+# "plotly" sends the series once and lets the browser animate it
+TS_RENDERER = os.environ.get("EARTHQUAKE_TS_RENDERER", "gif").strip().lower()
+
+# Filter inputs must stay unchanged this long before the dashboard refilters
+FILTER_DEBOUNCE_MS = float(os.environ.get("EARTHQUAKE_FILTER_DEBOUNCE_MS", "300"))
+
+# Worker processes for the time-series GIF and map renders (0 renders them on
+# the event loop), and how many renders may be waiting or running at once
+RENDER_POOL_SIZE = int(os.environ.get("EARTHQUAKE_RENDER_POOL_SIZE", "2"))
+RENDER_QUEUE_LIMIT = int(os.environ.get("EARTHQUAKE_RENDER_QUEUE_LIMIT", "16"))
+
+# Above this many filtered events the map shows grid cells instead of points
+MAP_AGGREGATE_THRESHOLD = int(os.environ.get("EARTHQUAKE_MAP_AGGREGATE_THRESHOLD", "100000"))
+MAP_CELL_DEGREES = float(os.environ.get("EARTHQUAKE_MAP_CELL_DEGREES", "1.0"))
+
+# Magnitude vs depth scatter: WebGL above the first size, thinned to about
+# SCATTER_MAX_POINTS points above the second
+SCATTER_WEBGL_THRESHOLD = int(os.environ.get("EARTHQUAKE_SCATTER_WEBGL_THRESHOLD", "1000"))
+SCATTER_DOWNSAMPLE_THRESHOLD = int(os.environ.get("EARTHQUAKE_SCATTER_DOWNSAMPLE_THRESHOLD", "50000"))
+SCATTER_MAX_POINTS = int(os.environ.get("EARTHQUAKE_SCATTER_MAX_POINTS", "20000"))
+
+# Scatterplot matrix: a stratified sample of about SPLOM_MAX_POINTS rows above
+# that size, and binned density panels above SPLOM_BIN_THRESHOLD rows
+SPLOM_MAX_POINTS = int(os.environ.get("EARTHQUAKE_SPLOM_MAX_POINTS", "5000"))
+SPLOM_BIN_THRESHOLD = int(os.environ.get("EARTHQUAKE_SPLOM_BIN_THRESHOLD", "50000"))
+SPLOM_BINS = int(os.environ.get("EARTHQUAKE_SPLOM_BINS", "40"))
+
+# Opt-in render timing: histograms served in Prometheus text format on
+# METRICS_HOST:METRICS_PORT (0 disables the endpoint) and an Admin tab
+METRICS_ENABLED = _env_flag("EARTHQUAKE_METRICS")
+METRICS_HOST = os.environ.get("EARTHQUAKE_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("EARTHQUAKE_METRICS_PORT", "9109"))
+
+# How often each process checks the dataset snapshot for appended events,
+# and sessions check for a new data version
+DATA_POLL_SECS = float(os.environ.get("EARTHQUAKE_DATA_POLL_SECS", "2"))
+
+# Optional source of new events, polled every FEED_SECS by one process per
+# cache directory: a USGS GeoJSON feed, or a CSV laid out like the
+# earthquakes CSV (URL or local path)
+FEED_URL = os.environ.get("EARTHQUAKE_FEED_URL")
+FEED_SECS = float(os.environ.get("EARTHQUAKE_FEED_SECS", "60"))
@@ -0,0 +1,188 @@
+"""Precomputed magnitude/depth/magType count cube for the category heatmap."""
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+class CategoryCube:
+    """Event counts over fine magnitude bins x fine depth bins x magType.
+
+    Fine bins are right-closed like ``pd.cut`` and their edges include the
+    magnitude/depth category edges, so every fine bin lies inside exactly one
+    category. A filter is answered by summing the fine bins that lie wholly
+    inside the slider ranges and then counting only the rows that fall in
+    the partially covered bins at the ends, which keeps results identical
+    to grouping the filtered rows.
+
+    Rows appended later are counted in a small cube of their own (see
+    extended) whose totals are added on, so the counts are never copied.
+    """
+
+    MAG_STEP = 0.1
+    DEPTH_STEP = 10.0
+
+    # Arrays that to_arrays/from_arrays store and restore
+    ARRAY_NAMES = ("_mag_edges", "_depth_edges", "_mag_bin_cat", "_mag_bin_seen",
+                   "_depth_bin_cat", "_depth_bin_seen", "_counts")
+
+    def __init__(self, earthquakes, filter_index):
+        self._set_rows(earthquakes, filter_index)
+
+        magnitude = earthquakes["magnitude"].to_numpy(dtype=float)
+        depth = earthquakes["depth"].to_numpy(dtype=float)
+        type_codes = filter_index.type_codes
+
+        self._mag_edges, mag_bins = self._fine_bins(magnitude, self.MAG_STEP)
+        self._depth_edges, depth_bins = self._fine_bins(depth, self.DEPTH_STEP)
+        self._mag_bin_cat, self._mag_bin_seen = self._bin_categories(
+            mag_bins, self._row_mag_cat, len(self._mag_edges) - 1)
+        self._depth_bin_cat, self._depth_bin_seen = self._bin_categories(
+            depth_bins, self._row_depth_cat, len(self._depth_edges) - 1)
+
+        # Rows with a missing magType never match a filter, so leave them out
+        valid = type_codes >= 0
+        shape = (len(self._mag_edges) - 1, len(self._depth_edges) - 1, max(self._n_types, 1))
+        flat = np.ravel_multi_index((mag_bins[valid], depth_bins[valid], type_codes[valid]), shape)
+        self._counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        self._delta = None
+
+    def _set_rows(self, earthquakes, filter_index):
+        """Point the cube at the frame's category columns and the filter index."""
+        self._index = filter_index
+        self._n_types = filter_index.n_types
+        self._mag_cat = earthquakes["magnitude_category"]
+        self._depth_cat = earthquakes["depth_category"]
+        self._row_mag_cat = self._mag_cat.cat.codes.to_numpy()
+        self._row_depth_cat = self._depth_cat.cat.codes.to_numpy()
+
+    def to_arrays(self):
+        """The arrays from_arrays rebuilds this cube from, for snapshotting."""
+        return {name.lstrip("_"): getattr(self, name) for name in self.ARRAY_NAMES}
+
+    @classmethod
+    def from_arrays(cls, earthquakes, filter_index, arrays):
+        """Rebuild the cube over earthquakes from to_arrays() output, without binning the rows."""
+        cube = cls.__new__(cls)
+        cube._set_rows(earthquakes, filter_index)
+        for name in cls.ARRAY_NAMES:
+            setattr(cube, name, arrays[name.lstrip("_")])
+        cube._delta = None
+        return cube
+
+    def extended(self, earthquakes, filter_index):
+        """Return the cube for earthquakes, whose leading rows are the ones counted here.
+
+        The rows after those are counted in a separate cube over
+        filter_index.delta, and heatmap_data adds its totals to these.
+
+        Args:
+            earthquakes: The whole frame, new rows last
+            filter_index: This cube's FilterIndex, extended over earthquakes
+        """
+        cube = copy.copy(self)
+        cube._delta = None
+        if filter_index.delta is not None:
+            start = len(self._row_mag_cat)
+            cube._delta = CategoryCube(earthquakes.iloc[start:], filter_index.delta)
+        return cube
+
+    @staticmethod
+    def _inside(values, edges):
+        """Whether every value falls in one of the right-closed bins between edges."""
+        return len(values) == 0 or (values.min() > edges[0] and values.max() <= edges[-1])
+
+    @staticmethod
+    def _fine_bins(values, step):
+        """Return right-closed bin edges on multiples of step, and each value's bin."""
+        lo = np.floor(values.min() / step) - 1 if len(values) else 0
+        hi = np.ceil(values.max() / step) + 1 if len(values) else 1
+        edges = np.round(np.arange(lo, hi + 1) * step, 10)
+        bins = np.searchsorted(edges, values, side="left") - 1
+        return edges, bins
+
+    @staticmethod
+    def _bin_categories(bins, row_cats, n_bins):
+        """Category code of each fine bin, checking bins don't straddle categories.
+
+        Returns:
+            (category code per bin, 0 where empty; whether each bin has rows)
+        """
+        lowest = np.full(n_bins, np.iinfo(np.int64).max)
+        highest = np.full(n_bins, -1)
+        np.minimum.at(lowest, bins, row_cats)
+        np.maximum.at(highest, bins, row_cats)
+        occupied = highest >= 0
+        if np.any(lowest[occupied] != highest[occupied]):
+            raise ValueError("Fine bins must nest inside the category bins")
+        return np.where(occupied, highest, 0), occupied
+
+    @staticmethod
+    def _merge_bin_categories(bin_cats, seen, bins, row_cats):
+        """Add new rows to the per-bin category codes from _bin_categories."""
+        new_cats, new_seen = CategoryCube._bin_categories(bins, row_cats, len(bin_cats))
+        both = seen & new_seen
+        if np.any(bin_cats[both] != new_cats[both]):
+            raise ValueError("Fine bins must nest inside the category bins")
+        return np.where(new_seen, new_cats, bin_cats), seen | new_seen
+
+    def heatmap_data(self, magnitude, depth, mag_types):
+        """Counts per (magnitude_category, depth_category) for a filter.
+
+        Returns:
+            The same frame as
+            ``filtered.groupby(['magnitude_category', 'depth_category']).size()
+            .reset_index(name='count')``
+        """
+        totals = self._totals(magnitude, depth, mag_types)
+        if self._delta is not None:
+            totals += self._delta._totals(magnitude, depth, mag_types)
+        return self._as_groupby_frame(totals)
+
+    def _totals(self, magnitude, depth, mag_types):
+        """Count matrix of magnitude x depth category codes for a filter, over this cube's rows."""
+        n_mag_cats = len(self._mag_cat.cat.categories)
+        n_depth_cats = len(self._depth_cat.cat.categories)
+        totals = np.zeros((n_mag_cats, n_depth_cats), dtype=np.int64)
+
+        mag_inner, mag_edge_rows = self._split_range("magnitude", self._mag_edges, magnitude)
+        depth_inner, depth_edge_rows = self._split_range("depth", self._depth_edges, depth)
+        types = self._index.type_bitmap(mag_types)[:self._n_types]
+        if mag_inner.stop > mag_inner.start and depth_inner.stop > depth_inner.start and types.any():
+            inner = self._counts[mag_inner, depth_inner][:, :, types].sum(axis=2)
+            np.add.at(totals, (self._mag_bin_cat[mag_inner, None], self._depth_bin_cat[None, depth_inner]), inner)
+
+        # Rows in the partially covered end bins of either range
+        rows = np.unique(np.concatenate([mag_edge_rows, depth_edge_rows]))
+        rows = rows[self._index.matches(rows, magnitude, depth, mag_types)]
+        np.add.at(totals, (self._row_mag_cat[rows], self._row_depth_cat[rows]), 1)
+        return totals
+
+    def _split_range(self, column, edges, bounds):
+        """Split an inclusive range into whole fine bins and the rows at its ends.
+
+        Returns:
+            (slice of fine bins lying inside the range, positions of rows in
+            the range that are not in those bins)
+        """
+        lo, hi = bounds
+        first = np.searchsorted(edges, lo, side="left")       # first edge >= lo
+        last = np.searchsorted(edges, hi, side="right") - 1   # last edge <= hi
+        if first >= last:
+            return slice(0, 0), self._index.range_rows(column, lo, hi)
+        below = self._index.range_rows(column, lo, edges[first])
+        above = self._index.range_rows(column, np.nextafter(edges[last], np.inf), hi)
+        return slice(first, last), np.concatenate([below, above])
+
+    def _as_groupby_frame(self, totals):
+        """Shape a category count matrix like the categorical groupby result."""
+        mag_codes, depth_codes = np.nonzero(totals)
+        present = pd.DataFrame({
+            "magnitude_category": pd.Categorical.from_codes(mag_codes, dtype=self._mag_cat.dtype),
+            "depth_category": pd.Categorical.from_codes(depth_codes, dtype=self._depth_cat.dtype),
+            "count": totals[mag_codes, depth_codes],
+        })
+        # Group again so empty category pairs get a zero count, like grouping
+        # the raw rows with observed=False
+        return (present.groupby(["magnitude_category", "depth_category"], observed=False)["count"]
+                .sum().reset_index(name="count"))
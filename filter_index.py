@@ -0,0 +1,258 @@
+"""Prebuilt index for the dashboard's magnitude/depth/magType filter."""
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """Answer the dashboard filter with row positions instead of full scans.
+
+    Magnitude and depth are stored sorted together with their argsort
+    permutation, so a range lookup is two ``searchsorted`` calls. magType is
+    stored as categorical codes plus the row positions of each code, and a
+    selection of types becomes a boolean bitmap over the codes.
+
+    A query starts from whichever predicate matches the fewest rows and
+    intersects it with the other two by checking only those candidates.
+
+    extended() covers rows appended after the index was built with a small
+    index of their own, returned in a new object, so sessions still using
+    the old index keep seeing consistent arrays and the big sorted arrays
+    are never copied.
+    """
+
+    RANGE_COLUMNS = ("magnitude", "depth")
+    VALUE_COLUMNS = RANGE_COLUMNS + ("latitude", "longitude")
+
+    def __init__(self, earthquakes):
+        self.n_rows = len(earthquakes)
+        self._values = _value_arrays(earthquakes, self.VALUE_COLUMNS)
+        self._sorted = {}
+        for column in self.RANGE_COLUMNS:
+            values = self._values[column]
+            order = np.argsort(values, kind="stable")
+            self._sorted[column] = (values[order], order)
+
+        codes, categories = pd.factorize(earthquakes["magType"])
+        self._type_codes = codes
+        self._type_lookup = {value: i for i, value in enumerate(categories)}
+        self._type_rows = [np.flatnonzero(codes == i) for i in range(len(categories))]
+        self._type_counts = np.array([len(rows) for rows in self._type_rows], dtype=np.int64)
+        self._delta = None
+        self._delta_start = self.n_rows
+
+    def to_arrays(self):
+        """The arrays from_arrays rebuilds this index from, for snapshotting."""
+        arrays = {}
+        for column, (sorted_values, order) in self._sorted.items():
+            arrays[f"{column}_sorted"] = sorted_values
+            arrays[f"{column}_order"] = order
+        arrays["type_codes"] = self._type_codes
+        arrays["type_names"] = np.array([str(value) for value in self._type_lookup])
+        arrays["type_rows"] = np.concatenate([np.empty(0, dtype=np.intp), *self._type_rows])
+        arrays["type_offsets"] = np.concatenate([[0], np.cumsum(self._type_counts)])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, earthquakes, arrays):
+        """Rebuild the index over earthquakes from to_arrays() output.
+
+        The arrays are used as they are, so memory-mapped ones stay shared
+        between processes; the value columns are read from the frame.
+        """
+        index = cls.__new__(cls)
+        index.n_rows = len(earthquakes)
+        index._values = _value_arrays(earthquakes, cls.VALUE_COLUMNS)
+        index._sorted = {column: (arrays[f"{column}_sorted"], arrays[f"{column}_order"])
+                         for column in cls.RANGE_COLUMNS}
+        index._type_codes = arrays["type_codes"]
+        index._type_lookup = {value: i for i, value in enumerate(arrays["type_names"].tolist())}
+        offsets = arrays["type_offsets"]
+        index._type_rows = [arrays["type_rows"][offsets[i]:offsets[i + 1]]
+                            for i in range(len(offsets) - 1)]
+        index._type_counts = np.diff(offsets)
+        index._delta = None
+        index._delta_start = index.n_rows
+        return index
+
+    def extended(self, earthquakes):
+        """Return an index over earthquakes, whose first rows are the ones indexed here.
+
+        The rows after those are indexed on their own in a small FilterIndex
+        (see delta), which every lookup also consults. The result is the
+        same as indexing earthquakes from scratch, while this index's arrays
+        are shared, not copied. Extending an extended index replaces its
+        delta.
+
+        Args:
+            earthquakes: The whole frame, new rows last
+        """
+        index = copy.copy(self)
+        index.n_rows = len(earthquakes)
+        index._values = _value_arrays(earthquakes, self.VALUE_COLUMNS)
+        index._delta = None
+        if index.n_rows > self._delta_start:
+            index._delta = FilterIndex(earthquakes.iloc[self._delta_start:])
+        return index
+
+    @property
+    def delta(self):
+        """FilterIndex over the rows added by extended(), numbered from 0, or None."""
+        return self._delta
+
+    @property
+    def type_codes(self):
+        """magType code of every row (-1 where missing), as used by type_bitmap.
+
+        Like n_types and type_bitmap, this leaves out the rows added by
+        extended(); they are coded in delta.
+        """
+        return self._type_codes
+
+    @property
+    def n_types(self):
+        """Number of distinct magType values."""
+        return len(self._type_rows)
+
+    def range_rows(self, column, lo, hi):
+        """Return row positions with lo <= column <= hi, in column order.
+
+        Rows added by extended() come last, in their own column order.
+        """
+        rows = self._range_rows(column, lo, hi)
+        if self._delta is None:
+            return rows
+        return np.concatenate([rows, self._delta.range_rows(column, lo, hi) + self._delta_start])
+
+    def _range_rows(self, column, lo, hi):
+        """range_rows() over the rows indexed when this index was built."""
+        values, order = self._sorted[column]
+        start = np.searchsorted(values, lo, side="left")
+        stop = np.searchsorted(values, hi, side="right")
+        return order[start:stop]
+
+    def type_bitmap(self, mag_types):
+        """Return a boolean lookup over magType codes for the selected types.
+
+        The extra trailing slot is indexed by code -1 (missing magType),
+        which never matches.
+        """
+        bitmap = np.zeros(len(self._type_rows) + 1, dtype=bool)
+        for value in mag_types:
+            code = self._type_lookup.get(value)
+            if code is not None:
+                bitmap[code] = True
+        return bitmap
+
+    def query(self, magnitude, depth, mag_types):
+        """Return the sorted row positions matching the filter.
+
+        Args:
+            magnitude: (min, max) magnitude, inclusive
+            depth: (min, max) depth in km, inclusive
+            mag_types: Iterable of magType values to keep
+
+        Returns:
+            Sorted int array of row positions, usable with ``DataFrame.take``
+        """
+        rows = self._query(magnitude, depth, mag_types)
+        if self._delta is None:
+            return rows
+        # Appended rows are numbered after all the others, so this stays sorted
+        return np.concatenate([rows, self._delta.query(magnitude, depth, mag_types) + self._delta_start])
+
+    def _query(self, magnitude, depth, mag_types):
+        """query() over the rows indexed when this index was built."""
+        bitmap = self.type_bitmap(mag_types)
+        mag_rows = self._range_rows("magnitude", *magnitude)
+        depth_rows = self._range_rows("depth", *depth)
+        n_type_rows = int(self._type_counts[bitmap[:-1]].sum())
+
+        smallest = min(len(mag_rows), len(depth_rows), n_type_rows)
+        if smallest == 0:
+            return np.empty(0, dtype=np.intp)
+        if smallest == n_type_rows:
+            rows = np.concatenate([r for code, r in enumerate(self._type_rows) if bitmap[code]])
+            rows = rows[self._in_range(rows, "magnitude", magnitude)
+                        & self._in_range(rows, "depth", depth)]
+        elif smallest == len(mag_rows):
+            rows = mag_rows[self._in_range(mag_rows, "depth", depth)
+                            & bitmap[self._type_codes[mag_rows]]]
+        else:
+            rows = depth_rows[self._in_range(depth_rows, "magnitude", magnitude)
+                              & bitmap[self._type_codes[depth_rows]]]
+        return np.sort(rows)
+
+    def matches(self, rows, magnitude, depth, mag_types):
+        """Boolean mask of which of the given row positions match the filter."""
+        rows = np.asarray(rows)
+        mask = self._in_range(rows, "magnitude", magnitude) & self._in_range(rows, "depth", depth)
+        indexed = rows < self._delta_start
+        mask[indexed] &= self.type_bitmap(mag_types)[self._type_codes[rows[indexed]]]
+        if self._delta is not None:
+            added = ~indexed
+            mask[added] &= self._delta.type_bitmap(mag_types)[
+                self._delta.type_codes[rows[added] - self._delta_start]]
+        return mask
+
+    def aggregate_grid(self, rows, cell_degrees):
+        """Summarize the given rows per grid cell.
+
+        Returns:
+            DataFrame with one row per non-empty cell: the cell centre
+            ('latitude', 'longitude'), 'count', 'max_magnitude' and
+            'mean_depth'
+        """
+        cells = _cell_numbers(self._values["latitude"][rows], self._values["longitude"][rows],
+                              cell_degrees)
+        cell_ids, inverse = np.unique(cells, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(cell_ids))
+        depth_sums = np.bincount(inverse, weights=self._values["depth"][rows],
+                                 minlength=len(cell_ids))
+        max_mag = np.full(len(cell_ids), -np.inf)
+        np.maximum.at(max_mag, inverse, self._values["magnitude"][rows])
+
+        n_cols = int(np.ceil(360 / cell_degrees))
+        return pd.DataFrame({
+            "latitude": (cell_ids // n_cols + 0.5) * cell_degrees - 90,
+            "longitude": (cell_ids % n_cols + 0.5) * cell_degrees - 180,
+            "count": counts,
+            "max_magnitude": max_mag,
+            "mean_depth": depth_sums / counts,
+        })
+
+    def _in_range(self, rows, column, bounds):
+        """Boolean mask of which rows fall inside the inclusive bounds."""
+        values = self._values[column][rows]
+        return (values >= bounds[0]) & (values <= bounds[1])
+
+
+def _value_arrays(earthquakes, columns):
+    """Float arrays of the given columns (views of float64 columns, not copies)."""
+    return {column: earthquakes[column].to_numpy(dtype=float) for column in columns}
+
+
+def _cell_numbers(latitude, longitude, cell_degrees):
+    """Cell number of each point on a lat/lon grid, numbered row by row."""
+    n_cols = int(np.ceil(360 / cell_degrees))
+    n_rows = int(np.ceil(180 / cell_degrees))
+    col = np.floor((longitude + 180) / cell_degrees)
+    row = np.floor((latitude + 90) / cell_degrees)
+    col = np.clip(col, 0, n_cols - 1).astype(np.int64)
+    row = np.clip(row, 0, n_rows - 1).astype(np.int64)
+    return row * n_cols + col
+
+
+def normalize_filter(magnitude, depth, mag_types):
+    """Return the filter as a hashable, canonical tuple.
+
+    Slider values are rounded so that floating-point noise from the client
+    doesn't split otherwise identical filters; the result can be passed
+    straight to FilterIndex.query.
+    """
+    return (
+        (round(float(magnitude[0]), 9), round(float(magnitude[1]), 9)),
+        (round(float(depth[0]), 9), round(float(depth[1]), 9)),
+        tuple(sorted(mag_types)),
+    )
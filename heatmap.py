@@ -1,4 +1,3 @@
-import plotly.express as px
 import pandas as pd
 
 def build_mag_depth_heatmap(df: pd.DataFrame):
@@ -7,6 +6,17 @@ def build_mag_depth_heatmap(df: pd.DataFrame):
     Uses 'magnitude_category' and 'depth_category' columns in the DataFrame.
     """
     heatmap_data = df.groupby(['magnitude_category', 'depth_category']).size().reset_index(name='count')
+    return build_mag_depth_heatmap_from_counts(heatmap_data)
+
+
+def build_mag_depth_heatmap_from_counts(heatmap_data: pd.DataFrame):
+    """
+    Create the magnitude/depth category heatmap from precomputed counts.
+    Expects one row per category pair with a 'count' column, as returned by
+    CategoryCube.heatmap_data.
+    """
+    import plotly.express as px
+
     heatmap_pivot = heatmap_data.pivot(index='magnitude_category', columns='depth_category', values='count').fillna(0)
     fig = px.imshow(
         heatmap_pivot,
@@ -1,28 +1,179 @@
 """Helper functions for earthquake dashboard."""
+import gzip
+import inspect
 import json
 import urllib.request
 
+import numpy as np
 import pandas as pd
 
+from config import CACHE_DIR, OFFLINE, PLATES_FILE, PLATES_TIMEOUT, PLATES_URL, SNAPSHOT_ENABLED
+from snapshot import content_key, load_or_build, snapshot_key
+
 # Cache tectonic plates data
 _tectonic_plates_cache = None
+_plate_lines_cache = None
+
+# Douglas-Peucker tolerances (degrees) of the precomputed plate line levels
+PLATE_TOLERANCES = (0.0, 0.02, 0.1, 0.3)
 
 
 def get_tectonic_plates():
-    """Fetch tectonic plate boundaries GeoJSON (cached)."""
+    """Return tectonic plate boundaries GeoJSON (cached).
+
+    Reads the bundled copy in PLATES_FILE when it exists and only falls back
+    to downloading it when it is missing and offline mode is off. Offline,
+    the bundle is required: run bundle_plates.py when installing.
+    """
     global _tectonic_plates_cache
     if _tectonic_plates_cache is None:
-        # Using the PB2002 plate boundaries dataset from GitHub
-        url = "https://raw.githubusercontent.com/fraxen/tectonicplates/master/GeoJSON/PB2002_boundaries.json"
-        try:
-            with urllib.request.urlopen(url, timeout=10) as response:
-                _tectonic_plates_cache = json.loads(response.read().decode())
-        except Exception as e:
-            print(f"Could not fetch tectonic plates: {e}")
-            _tectonic_plates_cache = {"type": "FeatureCollection", "features": []}
+        if PLATES_FILE.is_file():
+            with gzip.open(PLATES_FILE, "rt") as f:
+                _tectonic_plates_cache = json.load(f)
+        elif OFFLINE:
+            raise RuntimeError(f"EARTHQUAKE_OFFLINE is set, but the plate boundaries file {PLATES_FILE} "
+                               "is missing; run bundle_plates.py once with network access")
+        else:
+            _tectonic_plates_cache = fetch_tectonic_plates()
     return _tectonic_plates_cache
 
 
+def get_plate_lines(tolerance=0.0):
+    """Return plate boundary lines as one (lons, lats) pair of arrays (cached).
+
+    Lines are separated by NaN, which Plotly draws as a gap, so every
+    boundary can go into a single trace. All PLATE_TOLERANCES levels are
+    simplified on the first call; tolerance (in degrees) picks one of them.
+    The levels are snapshotted under CACHE_DIR and memory-mapped, keyed by
+    the bundled PLATES_FILE or, without one, by PLATES_URL. Worker processes
+    share them, and without a bundle only the first of them downloads the
+    GeoJSON. A failed download isn't snapshotted, so a later start retries.
+    """
+    global _plate_lines_cache
+    if _plate_lines_cache is None:
+        if SNAPSHOT_ENABLED and (PLATES_FILE.is_file() or not OFFLINE):
+            code_version = f"{PLATE_TOLERANCES}\n{inspect.getsource(simplify_line)}"
+            if PLATES_FILE.is_file():
+                key = snapshot_key(PLATES_FILE, code_version)
+            else:
+                key = content_key(PLATES_URL, code_version)
+            try:
+                frame = load_or_build(CACHE_DIR / f"plates-{key}", _build_plate_lines_frame)
+                _plate_lines_cache = _split_plate_lines(frame)
+            except _NoPlateLines:
+                _plate_lines_cache = _build_plate_lines()
+        else:
+            _plate_lines_cache = _build_plate_lines()
+    return _plate_lines_cache[tolerance]
+
+
+class _NoPlateLines(Exception):
+    """Raised instead of snapshotting an empty set of plate boundaries."""
+
+
+def _build_plate_lines():
+    """Simplify the plate boundaries at every PLATE_TOLERANCES level."""
+    lines = []
+    for feature in get_tectonic_plates().get("features", []):
+        geometry = feature["geometry"]
+        if geometry["type"] == "LineString":
+            lines.append(geometry["coordinates"])
+        elif geometry["type"] == "MultiLineString":
+            lines.extend(geometry["coordinates"])
+    lines = [np.asarray(line, dtype=float)[:, :2] for line in lines if line]
+    return {
+        tol: _join_lines([simplify_line(line, tol) for line in lines])
+        for tol in PLATE_TOLERANCES
+    }
+
+
+def _build_plate_lines_frame():
+    """Simplify the plate boundaries into a frame for snapshotting."""
+    levels = _build_plate_lines()
+    if not len(levels[0.0][0]):
+        raise _NoPlateLines()
+    return _plate_lines_frame(levels)
+
+
+def _plate_lines_frame(levels):
+    """Stack the simplified levels into one frame for snapshotting."""
+    return pd.DataFrame({
+        "level": np.concatenate([np.full(len(levels[tol][0]), i, dtype=np.int8)
+                                 for i, tol in enumerate(PLATE_TOLERANCES)]),
+        "lon": np.concatenate([levels[tol][0] for tol in PLATE_TOLERANCES]),
+        "lat": np.concatenate([levels[tol][1] for tol in PLATE_TOLERANCES]),
+    })
+
+
+def _split_plate_lines(frame):
+    """Slice a frame from _plate_lines_frame back into read-only per-level arrays."""
+    bounds = np.searchsorted(frame["level"].to_numpy(), np.arange(len(PLATE_TOLERANCES) + 1))
+    lons, lats = frame["lon"].to_numpy(), frame["lat"].to_numpy()
+    levels = {}
+    for i, tol in enumerate(PLATE_TOLERANCES):
+        level = (lons[bounds[i]:bounds[i + 1]], lats[bounds[i]:bounds[i + 1]])
+        for values in level:
+            values.setflags(write=False)
+        levels[tol] = level
+    return levels
+
+
+def simplify_line(coords, tolerance):
+    """Simplify an (n, 2) array of points with the Douglas-Peucker algorithm."""
+    n = len(coords)
+    if tolerance <= 0 or n < 3:
+        return coords
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = coords[start], coords[end]
+        inner = coords[start + 1:end]
+        dx, dy = b - a
+        length = np.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            # Perpendicular distance of each inner point to the chord a-b
+            dist = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return coords[keep]
+
+
+def _join_lines(lines):
+    """Concatenate lines into read-only lon/lat arrays separated by NaN."""
+    gap = np.full((1, 2), np.nan)
+    parts = []
+    for line in lines:
+        if parts:
+            parts.append(gap)
+        parts.append(line)
+    coords = np.concatenate(parts) if parts else np.empty((0, 2))
+    lons = np.ascontiguousarray(coords[:, 0])
+    lats = np.ascontiguousarray(coords[:, 1])
+    lons.setflags(write=False)
+    lats.setflags(write=False)
+    return lons, lats
+
+
+def fetch_tectonic_plates():
+    """Download the PB2002 plate boundaries GeoJSON from GitHub."""
+    try:
+        with urllib.request.urlopen(PLATES_URL, timeout=PLATES_TIMEOUT) as response:
+            return json.loads(response.read().decode())
+    except Exception as e:
+        print(f"Could not fetch tectonic plates: {e}")
+        return {"type": "FeatureCollection", "features": []}
+
+
 def get_alert_color(alert):
     """Return a color based on alert level."""
     colors = {"green": "#22c55e", "yellow": "#eab308", "orange": "#f97316", "red": "#ef4444"}
@@ -34,4 +185,3 @@ def format_date(dt):
     if pd.isna(dt):
         return "Unknown"
     return dt.strftime("%B %d, %Y")
-
@@ -0,0 +1,195 @@
+"""Append new events to the served dataset without reprocessing the catalog.
+
+Events are appended to the dataset snapshot, which every worker process
+memory-maps and polls (see shared.refresh), so they reach all workers and
+are still there after a restart. start_feed() makes one process poll
+EARTHQUAKE_FEED_URL for them.
+"""
+import json
+import threading
+import time
+import urllib.request
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker polls the feed
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+import shared
+from config import CACHE_DIR, FEED_SECS, FEED_URL, OFFLINE, SNAPSHOT_ENABLED
+from processing import process_earthquakes
+from snapshot import append_snapshot, load_snapshot, snapshot_lock
+
+# Rebuild the snapshotted indexes once the rows appended since they were
+# built reach this share of the rows they cover
+REINDEX_FRACTION = 0.1
+
+# Seconds to wait for the feed to answer
+FEED_TIMEOUT = 30
+
+# Properties of USGS GeoJSON features that have a column of the same name
+# in the earthquakes CSV
+GEOJSON_PROPERTIES = (
+    "title", "time", "updated", "url", "felt", "cdi", "mmi", "alert", "status", "tsunami",
+    "sig", "net", "code", "ids", "sources", "types", "nst", "dmin", "rms", "gap", "magType",
+    "type", "place",
+)
+
+_ingest_lock = threading.Lock()
+# (sorted hashes of the snapshot's ids, their row positions, rows hashed so
+# far), built on the first append and extended after that
+_known_ids = None
+_csv_columns = None
+_feed = None
+
+
+def append_events(raw):
+    """Process a batch of new events and append the unseen ones to the dataset.
+
+    Only the batch goes through process_earthquakes, and only its rows are
+    written to the snapshot (see snapshot.append_snapshot). Events whose id
+    is already in the dataset are dropped. Every process serving the
+    snapshot, this one included, then publishes the new rows as a new data
+    version, which open sessions pick up within DATA_POLL_SECS. Safe to
+    call from any thread or process; appends are applied one at a time.
+    Needs snapshots enabled.
+
+    Args:
+        raw: DataFrame with the columns of the earthquakes CSV; missing
+            columns are left empty
+
+    Returns:
+        Number of events added
+    """
+    global _csv_columns
+    directory = shared.snapshot_directory()
+    if directory is None:
+        raise RuntimeError("Appending events needs snapshots enabled (EARTHQUAKE_SNAPSHOT)")
+    if _csv_columns is None:
+        _csv_columns = pd.read_csv(shared.csv_file, nrows=0).columns
+    batch = process_earthquakes(raw.reindex(columns=_csv_columns))
+
+    with _ingest_lock, snapshot_lock(directory):
+        data = load_snapshot(directory)
+        batch = batch[~_known(data, batch["id"])]
+        if batch.empty:
+            return 0
+        append_snapshot(directory, batch)
+        indexed = data.attrs.get("index_rows", len(data))
+        if len(data) + len(batch) - indexed > REINDEX_FRACTION * indexed:
+            shared.reindex(directory)
+    shared.refresh()
+    return len(batch)
+
+
+def start_feed():
+    """Poll FEED_URL for new events every FEED_SECS, on a background thread.
+
+    Does nothing unless EARTHQUAKE_FEED_URL is set. Only one process per
+    cache directory polls the feed; the others get its events through the
+    snapshot.
+    """
+    global _feed
+    if not FEED_URL or _feed is not None:
+        return
+    if not SNAPSHOT_ENABLED:
+        print("EARTHQUAKE_FEED_URL needs snapshots enabled (EARTHQUAKE_SNAPSHOT); not polling it")
+        return
+    if OFFLINE and FEED_URL.startswith(("http://", "https://")):
+        print("EARTHQUAKE_OFFLINE is set; not polling EARTHQUAKE_FEED_URL")
+        return
+    lock = open(CACHE_DIR / "feed.lock", "w")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()  # another process polls the feed
+            return
+    # The thread keeps the lock file open, holding the lock while it runs
+    _feed = threading.Thread(target=_poll_feed, args=(lock,), name="event-feed", daemon=True)
+    _feed.start()
+
+
+def read_feed(source):
+    """Read events from a USGS GeoJSON feed, or a CSV laid out like the earthquakes CSV.
+
+    Args:
+        source: URL or local path; CSVs are recognized by their .csv suffix
+
+    Returns:
+        DataFrame with columns of the earthquakes CSV
+    """
+    if source.split("?")[0].endswith(".csv"):
+        return pd.read_csv(source)
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=FEED_TIMEOUT) as response:
+            return geojson_events(json.load(response))
+    with open(source) as f:
+        return geojson_events(json.load(f))
+
+
+def geojson_events(feed):
+    """Rows laid out like the earthquakes CSV for the features of a USGS GeoJSON feed.
+
+    Columns of the CSV that the feed doesn't have (e.g. country) are left
+    out, and append_events leaves them empty.
+    """
+    rows = []
+    for feature in feed.get("features", []):
+        properties = feature.get("properties") or {}
+        geometry = feature.get("geometry") or {}
+        longitude, latitude, depth = (list(geometry.get("coordinates") or []) + [None] * 3)[:3]
+        row = {name: properties.get(name) for name in GEOJSON_PROPERTIES}
+        row.update(
+            id=feature.get("id"), magnitude=properties.get("mag"),
+            detailUrl=properties.get("detail"), geometryType=geometry.get("type"),
+            latitude=latitude, longitude=longitude, depth=depth,
+            date=None if row["time"] is None else pd.to_datetime(row["time"], unit="ms").isoformat(),
+        )
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _poll_feed(lock):
+    while True:
+        try:
+            added = append_events(read_feed(FEED_URL))
+            if added:
+                print(f"Added {added} events from {FEED_URL}")
+        except Exception as e:
+            print(f"Could not add events from {FEED_URL}: {e}")
+        time.sleep(FEED_SECS)
+
+
+def _known(data, ids):
+    """Boolean mask of which ids are already in the snapshot frame data."""
+    global _known_ids
+    hashes, positions, rows = _known_ids or (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.intp), 0)
+    if rows > len(data):  # a new snapshot: start over
+        hashes, positions, rows = np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.intp), 0
+    if rows < len(data):
+        # Hash the rows appended since, by this process or others
+        new = _hash_ids(data["id"].iloc[rows:])
+        order = np.argsort(new, kind="stable")
+        at = np.searchsorted(hashes, new[order])
+        hashes = np.insert(hashes, at, new[order])
+        positions = np.insert(positions, at, order + rows)
+        _known_ids = (hashes, positions, len(data))
+
+    known = np.zeros(len(ids), dtype=bool)
+    if len(hashes) == 0:
+        return known
+    wanted = _hash_ids(ids)
+    at = np.minimum(np.searchsorted(hashes, wanted), len(hashes) - 1)
+    candidates = np.flatnonzero(hashes[at] == wanted)
+    # Compare the ids themselves, in case two ids share a hash
+    stored = data["id"].take(positions[at[candidates]]).to_numpy(dtype=object)
+    known[candidates] = stored == ids.to_numpy(dtype=object)[candidates]
+    return known
+
+
+def _hash_ids(ids):
+    return pd.util.hash_array(ids.to_numpy(dtype=object))
@@ -0,0 +1,250 @@
+"""Opt-in timing of the filter and the outputs, exported as Prometheus histograms.
+
+Enabled with EARTHQUAKE_METRICS=1. When it is off, instrument() returns the
+function unchanged and the hooks called from the caches return at once, so
+the hot path pays nothing.
+"""
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import UserString
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from htmltools import Tag, TagList
+from shiny import reactive
+
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROWS_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES_BUCKETS = (1_024, 8_192, 65_536, 262_144, 1_048_576, 4_194_304, 16_777_216, 67_108_864)
+
+# name -> (help text, buckets) of the per-output histograms
+HISTOGRAMS = {
+    "wall_seconds": ("Wall time of each call", SECONDS_BUCKETS),
+    "cpu_seconds": ("CPU time of the calling thread during each call", SECONDS_BUCKETS),
+    "rows": ("Filtered rows going into each call", ROWS_BUCKETS),
+    "payload_bytes": ("Size of the figure JSON or HTML each call produced", BYTES_BUCKETS),
+}
+PREFIX = "earthquake_render_"
+
+# The measurement of the innermost instrumented call in progress
+_current = contextvars.ContextVar("earthquake_render_sample", default=None)
+_server = None
+_server_lock = threading.Lock()
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram with fixed bucket bounds."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+
+class Metrics:
+    """Histograms and cache counters per output name; thread-safe."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def record(self, output, sample):
+        """Add one finished call's measurements under output."""
+        with self._lock:
+            for name, value in sample.items():
+                if name in HISTOGRAMS and value is not None:
+                    key = (name, output)
+                    if key not in self._histograms:
+                        self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+                    self._histograms[key].observe(value)
+            hits, misses = self._cache.get(output, (0, 0))
+            self._cache[output] = (hits + sample["cache_hits"], misses + sample["cache_misses"])
+
+    def prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in HISTOGRAMS.items():
+                metric = PREFIX + name
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for (hist_name, output), hist in sorted(self._histograms.items()):
+                    if hist_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{output="{output}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{output="{output}"}} {hist.sum!r}')
+                    lines.append(f'{metric}_count{{output="{output}"}} {hist.count}')
+            for i, kind in enumerate(("hits", "misses")):
+                metric = f"{PREFIX}cache_{kind}_total"
+                lines += [f"# HELP {metric} Cache {kind} during each call",
+                          f"# TYPE {metric} counter"]
+                for output, counts in sorted(self._cache.items()):
+                    lines.append(f'{metric}{{output="{output}"}} {counts[i]}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One row per output with call counts, mean and max times and sizes."""
+        with self._lock:
+            rows = []
+            for output in sorted(self._cache):
+                hists = {name: self._histograms.get((name, output)) for name in HISTOGRAMS}
+                wall, cpu = hists["wall_seconds"], hists["cpu_seconds"]
+                rows.append({
+                    "output": output,
+                    "calls": wall.count,
+                    "wall ms (mean)": round(1000 * wall.sum / wall.count, 1),
+                    "wall ms (max)": round(1000 * wall.max, 1),
+                    "cpu ms (mean)": round(1000 * cpu.sum / cpu.count, 1) if cpu else None,
+                    "rows (mean)": _mean(hists["rows"]),
+                    "payload KB (mean)": _mean(hists["payload_bytes"], 1024),
+                    "cache hits": self._cache[output][0],
+                    "cache misses": self._cache[output][1],
+                })
+        return pd.DataFrame(rows)
+
+
+metrics = Metrics()
+
+
+def instrument(output, rows=None):
+    """Decorator timing each call of a function under the name output.
+
+    Records wall time, CPU time (sync functions only), rows in, payload
+    bytes and result cache hits. Calls that raise, such as outputs waiting
+    on a running task, aren't recorded. Returns the function unchanged
+    when metrics are disabled.
+
+    Args:
+        output: Label for the measurements, usually the output id
+        rows: Callable returning the number of rows going in, evaluated
+            without taking a reactive dependency
+    """
+    def wrapper(f):
+        if not METRICS_ENABLED:
+            return f
+
+        if inspect.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def timed_async(*args, **kwargs):
+                sample, token = _start(rows)
+                try:
+                    result = await f(*args, **kwargs)
+                finally:
+                    _current.reset(token)
+                _finish(output, sample, result, cpu=False)
+                return result
+            return timed_async
+
+        @functools.wraps(f)
+        def timed(*args, **kwargs):
+            sample, token = _start(rows)
+            try:
+                result = f(*args, **kwargs)
+            finally:
+                _current.reset(token)
+            _finish(output, sample, result, cpu=True)
+            return result
+        return timed
+    return wrapper
+
+
+def record_cache(hit):
+    """Count a result cache lookup against the instrumented call in progress."""
+    sample = _current.get()
+    if sample is not None:
+        sample["cache_hits" if hit else "cache_misses"] += 1
+
+
+def record_payload(nbytes):
+    """Record the serialized size of the figure the current call produces."""
+    sample = _current.get()
+    if sample is not None:
+        sample["payload_bytes"] = nbytes
+
+
+def start_metrics_server():
+    """Serve metrics.prometheus() at /metrics on a daemon thread.
+
+    Does nothing when metrics or the endpoint are disabled, or after the
+    first call. With several workers only the first to bind the port
+    serves it; the others print a warning.
+    """
+    global _server
+    if not METRICS_ENABLED or METRICS_PORT <= 0:
+        return
+    with _server_lock:
+        if _server is not None:
+            return
+        try:
+            _server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+        except OSError as e:
+            print(f"Could not start the metrics endpoint on {METRICS_HOST}:{METRICS_PORT}: {e}")
+            _server = False
+            return
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start(rows):
+    sample = {"cache_hits": 0, "cache_misses": 0, "payload_bytes": None, "rows": None}
+    if rows is not None:
+        with reactive.isolate():
+            sample["rows"] = rows()
+    token = _current.set(sample)
+    sample["wall_start"] = time.perf_counter()
+    sample["cpu_start"] = time.thread_time()
+    return sample, token
+
+
+def _finish(output, sample, result, cpu):
+    sample["wall_seconds"] = time.perf_counter() - sample.pop("wall_start")
+    cpu_start = sample.pop("cpu_start")
+    sample["cpu_seconds"] = time.thread_time() - cpu_start if cpu else None
+    if sample["payload_bytes"] is None:
+        if isinstance(result, (str, bytes)):
+            sample["payload_bytes"] = len(result)
+        elif isinstance(result, (UserString, Tag, TagList)):
+            sample["payload_bytes"] = len(str(result))
+    metrics.record(output, sample)
+
+
+def _mean(hist, scale=1):
+    if hist is None or not hist.count:
+        return None
+    return round(hist.sum / hist.count / scale, 1)
@@ -1,14 +1,39 @@
 """Geographic earthquake map visualization."""
-import plotly.express as px
 import plotly.graph_objects as go
 
-from helpers import get_tectonic_plates
+from helpers import PLATE_TOLERANCES, get_plate_lines
 
+PLATE_LEGEND_GROUP = "tectonic"
 
-def build_earthquake_map(data, show_plates=True):
+
+# Columns build_earthquake_map reads
+MAP_COLUMNS = ["latitude", "longitude", "depth", "magnitude", "place", "datetime"]
+
+
+def plate_tolerance_for_zoom(zoom):
+    """Return the coarsest plate line level whose error stays under ~1 pixel.
+
+    A 256 px mapbox tile spans 360 / 2**zoom degrees of longitude.
+    """
+    degrees_per_pixel = 360 / (256 * 2 ** zoom)
+    return max(t for t in PLATE_TOLERANCES if t <= degrees_per_pixel or t == 0)
+
+
+def set_plate_detail(fig, zoom):
+    """Swap the plate boundary trace of a map figure to the level for zoom."""
+    tolerance = plate_tolerance_for_zoom(zoom)
+    for trace in fig.data:
+        if trace.legendgroup == PLATE_LEGEND_GROUP and trace.meta != tolerance:
+            lons, lats = get_plate_lines(tolerance)
+            trace.update(lon=lons, lat=lats, meta=tolerance)
+
+
+def build_earthquake_map(data, show_plates=True, zoom=1):
     """Return a Plotly mapbox figure for the given earthquake DataFrame."""
+    import plotly.express as px
+
     if data.empty:
-        fig = px.scatter_mapbox(lat=[], lon=[], zoom=1)
+        fig = px.scatter_mapbox(lat=[], lon=[], zoom=zoom)
         return fig
 
     fig = px.scatter_mapbox(
@@ -22,51 +47,71 @@ def build_earthquake_map(data, show_plates=True):
         size_max=15,
         color_continuous_scale="Viridis",
         labels={"depth": "Depth (km)", "magnitude": "Magnitude"},
-        zoom=1,
+        zoom=zoom,
     )
 
     fig.update_traces(marker_opacity=0.8, marker=dict(sizemin=0.01))
+    return _finish_map(fig, show_plates, zoom)
+
+
+def build_earthquake_density_map(cells, show_plates=True, zoom=1):
+    """Return a mapbox figure of earthquakes aggregated into grid cells.
+
+    Used instead of build_earthquake_map when there are too many events to
+    send as individual markers.
+
+    Args:
+        cells: DataFrame from FilterIndex.aggregate_grid
+        show_plates: Whether to draw tectonic plate boundaries
+        zoom: Initial map zoom
+
+    Returns:
+        Plotly figure object
+    """
+    import plotly.express as px
+
+    if cells.empty:
+        fig = px.scatter_mapbox(lat=[], lon=[], zoom=zoom)
+        return fig
+
+    fig = px.scatter_mapbox(
+        cells,
+        lat="latitude",
+        lon="longitude",
+        color="mean_depth",
+        size="count",
+        hover_data={"count": True, "max_magnitude": ":.1f", "mean_depth": ":.0f",
+                    "latitude": False, "longitude": False},
+        size_max=15,
+        color_continuous_scale="Viridis",
+        labels={"mean_depth": "Mean depth (km)", "max_magnitude": "Max magnitude",
+                "count": "Earthquakes"},
+        zoom=zoom,
+    )
+
+    fig.update_traces(marker_opacity=0.8, marker=dict(sizemin=2))
+    return _finish_map(fig, show_plates, zoom)
+
 
+def _finish_map(fig, show_plates, zoom):
+    """Add plate boundaries, legend and mapbox layout shared by both maps."""
     # Add tectonic plate boundaries
     if show_plates:
-        plates = get_tectonic_plates()
-        for feature in plates.get("features", []):
-            if feature["geometry"]["type"] == "LineString":
-                coords = feature["geometry"]["coordinates"]
-                lons = [c[0] for c in coords]
-                lats = [c[1] for c in coords]
-                fig.add_trace(go.Scattermapbox(
-                    lon=lons,
-                    lat=lats,
-                    mode="lines",
-                    line=dict(width=1.5, color="rgba(255, 100, 100, 0.6)"),
-                    hoverinfo="skip",
-                    showlegend=False,
-                ))
-            elif feature["geometry"]["type"] == "MultiLineString":
-                for line in feature["geometry"]["coordinates"]:
-                    lons = [c[0] for c in line]
-                    lats = [c[1] for c in line]
-                    fig.add_trace(go.Scattermapbox(
-                        lon=lons,
-                        lat=lats,
-                        mode="lines",
-                        line=dict(width=1.5, color="rgba(255, 100, 100, 0.6)"),
-                        hoverinfo="skip",
-                        showlegend=False,
-                    ))
-        # Add legend entry for tectonic plate boundary (dummy trace)
+        # All boundaries as one NaN-separated line, which also serves as the
+        # legend entry, simplified to match the zoom (meta records the level)
+        tolerance = plate_tolerance_for_zoom(zoom)
+        lons, lats = get_plate_lines(tolerance)
         fig.add_trace(go.Scattermapbox(
-            lon=[None, None],
-            lat=[None, None],
+            lon=lons,
+            lat=lats,
             mode="lines",
-            line=dict(width=2, color="rgba(255, 100, 100, 0.6)"),
+            line=dict(width=1.5, color="rgba(255, 100, 100, 0.6)"),
             name="Tectonic plate boundary",
             showlegend=True,
             hoverinfo="skip",
-            visible=True,
-            legendgroup="tectonic",
-            legendrank=100
+            legendgroup=PLATE_LEGEND_GROUP,
+            legendrank=100,
+            meta=tolerance,
         ))
         # Add padding to legend
         fig.update_layout(
@@ -0,0 +1,76 @@
+"""Compact in-memory layout for the processed earthquakes frame."""
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Columns where float32 (about 7 significant digits) is plenty. magnitude and
+# depth stay float64 because the filters and category bins compare them
+# exactly, and latitude/longitude because float32 values serialize to longer
+# JSON in the map figures.
+FLOAT32_COLUMNS = ("felt", "cdi", "mmi", "dmin", "gap", "nst")
+
+# Integer columns that need their full range (milliseconds since epoch)
+WIDE_INT_COLUMNS = ("time",)
+
+# High-cardinality text kept as strings, with one shared object per value
+INTERNED_COLUMNS = ("place",)
+
+# Other text columns become categoricals when at most this share of values is distinct
+CATEGORY_MAX_RATIO = 0.5
+
+
+def compact_earthquakes(earthquakes):
+    """Return the frame with smaller dtypes; values are unchanged.
+
+    Low-cardinality strings become categoricals, FLOAT32_COLUMNS become
+    float32, integer columns are downcast (tsunami and month to int8) and
+    the strings in INTERNED_COLUMNS are interned so repeated values share
+    one object.
+    """
+    columns = {}
+    for name, column in earthquakes.items():
+        if name in FLOAT32_COLUMNS and column.dtype == np.float64:
+            column = column.astype(np.float32)
+        elif column.dtype.kind in "iu" and name not in WIDE_INT_COLUMNS:
+            column = pd.to_numeric(column, downcast="integer")
+        elif column.dtype == object:
+            if name in INTERNED_COLUMNS:
+                column = column.map(_intern, na_action="ignore")
+            elif column.nunique() <= CATEGORY_MAX_RATIO * len(column):
+                column = column.astype("category")
+        columns[name] = column
+    return pd.DataFrame(columns, index=earthquakes.index)
+
+
+def memory_report(before, after):
+    """Per-column memory use of two versions of a frame.
+
+    Returns:
+        DataFrame indexed by column with dtypes and bytes before and after,
+        plus a TOTAL row
+    """
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": before.apply(column_bytes),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_after": after.apply(column_bytes),
+    })
+    report.loc["TOTAL"] = ["", report["bytes_before"].sum(), "", report["bytes_after"].sum()]
+    report["saved_pct"] = (100 * (1 - report["bytes_after"] / report["bytes_before"])).round(1)
+    return report
+
+
+def column_bytes(column):
+    """Memory held by a column, counting each shared string object once.
+
+    Unlike ``memory_usage(deep=True)`` this shows the saving from interning.
+    """
+    if column.dtype != object:
+        return int(column.memory_usage(deep=True, index=False))
+    unique = {id(v): v for v in column.array}
+    return column.array.nbytes + sum(sys.getsizeof(v) for v in unique.values())
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
@@ -5,12 +5,26 @@ from shiny import ui
 from helpers import format_date, get_alert_color
 
 
-def build_outliers_infographic(earthquakes):
-    """Build the top earthquakes infographic UI components."""
+# How each ranked column is shown in the top lists
+TOP_LIST_FORMATS = {
+    "magnitude": lambda quake: f"M {quake['magnitude']:.1f}",
+    "depth": lambda quake: f"{quake['depth']:.0f} km",
+    "felt": lambda quake: f"{int(quake['felt']):,} felt",
+}
+
+
+def build_outliers_infographic(earthquakes, ranking=None, rows=None):
+    """Build the top earthquakes infographic UI components.
+
+    With an OutlierRanking the outliers are looked up among the filtered
+    row positions (all rows if rows is None) instead of scanning the frame.
+    """
     # Get the top earthquake outliers
-    giant = earthquakes.nlargest(1, 'magnitude').reset_index(drop=True).iloc[0]
-    top_depth = earthquakes.nlargest(1, 'depth').reset_index(drop=True).iloc[0]
-    top_felt = earthquakes.nlargest(1, 'felt').reset_index(drop=True).iloc[0]
+    giant = _top_row(earthquakes, 'magnitude', ranking, rows)
+    top_depth = _top_row(earthquakes, 'depth', ranking, rows)
+    top_felt = _top_row(earthquakes, 'felt', ranking, rows)
+    if giant is None:
+        return ui.p("No earthquakes match the current filters", class_="text-muted small")
 
     # Build sidebar cards: first = deepest, last = highest felt
     sidebar_cards = []
@@ -47,8 +61,8 @@ def build_outliers_infographic(earthquakes):
     )
     sidebar_cards.append(card_depth)
 
-    # Last small card: highest felt
-    quake = top_felt
+    # Last small card: highest felt, left out if no event has felt reports
+    quake = top_felt if top_felt is not None else giant
     color = "#22c55e"
     quake_felt = int(quake['felt']) if not pd.isna(quake['felt']) else 0
     quake_alert = quake['alert'] if not pd.isna(quake['alert']) else "None"
@@ -78,7 +92,8 @@ def build_outliers_infographic(earthquakes):
         ),
         style="flex: 1;"
     )
-    sidebar_cards.append(card_felt)
+    if top_felt is not None:
+        sidebar_cards.append(card_felt)
     
     # Magnitude scale
     mag_percent = (giant['magnitude'] / 10) * 100
@@ -165,3 +180,28 @@ def build_outliers_infographic(earthquakes):
         ),
         class_="row g-3"
     )
+
+
+def build_top_list(earthquakes, column, positions):
+    """Build a ranked list of the earthquakes at positions, labelled by column."""
+    if len(positions) == 0:
+        return ui.p("No earthquakes match the current filters", class_="text-muted small")
+    items = []
+    for rank, (_, quake) in enumerate(earthquakes.take(positions).iterrows(), start=1):
+        items.append(ui.tags.li(
+            ui.span(f"{rank}.", class_="text-muted small", style="width: 2rem;"),
+            ui.span(TOP_LIST_FORMATS[column](quake), class_="fw-bold", style="width: 6rem;"),
+            ui.span(quake['place'], class_="small flex-grow-1"),
+            ui.tags.small(format_date(quake['datetime']), class_="text-muted"),
+            class_="list-group-item d-flex gap-3 align-items-center",
+        ))
+    return ui.tags.ul(*items, class_="list-group list-group-flush")
+
+
+def _top_row(earthquakes, column, ranking, rows):
+    """Row with the largest value of column, or None if there is none."""
+    if ranking is None:
+        top = earthquakes.nlargest(1, column)
+    else:
+        top = earthquakes.take(ranking.top_k(column, 1, rows))
+    return top.iloc[0] if len(top) else None
@@ -0,0 +1,63 @@
+"""Cleaning and derived columns for the raw earthquakes CSV frame.
+
+Kept apart from shared.py, which loads the dataset on import, so the
+pipeline can be reused (e.g. by the benchmarks) without loading it.
+"""
+import pandas as pd
+
+from config import MEMORY_REPORT
+from memory import compact_earthquakes, memory_report
+
+
+# --------------------------------------------------------
+# Data processing
+# --------------------------------------------------------
+
+def process_earthquakes(earthquakes):
+    """Clean the raw earthquakes CSV frame and add the derived columns."""
+    # Convert time to datetime (time is in milliseconds since epoch)
+    earthquakes['datetime'] = pd.to_datetime(earthquakes['time'], unit='ms')
+
+    # Make new columns for month and season
+    earthquakes['month'] = earthquakes['datetime'].dt.month
+    earthquakes['season'] = earthquakes['month'] % 12 // 3 + 1
+    season_mapping = {1: 'Winter', 2: 'Spring', 3: 'Summer', 4: 'Fall'}
+    earthquakes['season'] = earthquakes['season'].map(season_mapping)
+
+    # Categoerize magnitude to small, medium, large in new column
+    earthquakes['magnitude_category'] = pd.cut(
+        earthquakes['magnitude'],
+        bins=[-float('inf'), 4.0, 6.0, float('inf')],
+        labels=['Small', 'Medium', 'Large'])
+
+    # Categorize depth to shallow, intermediate, deep in new column
+    earthquakes['depth_category'] = pd.cut(
+        earthquakes['depth'],
+        bins=[-float('inf'), 70.0, 300.0, float('inf')],
+        labels=['Shallow', 'Intermediate', 'Deep'])
+
+    # Filter out rows with missing values in key columns
+    earthquakes = earthquakes.dropna(subset=['magnitude', 'depth', 'latitude', 'longitude'])
+    earthquakes = earthquakes.reset_index(drop=True) # Reset index after filtering
+
+    # Delete duplicate rows based on 'id' column
+    earthquakes = earthquakes.drop_duplicates(subset=['id'])
+
+    # Remove unnecessary columns
+    columns_to_drop = [
+        "type", "updated", "url", "detailUrl", "status", "code", "sources",
+        "types", "rms", "geometryType", "placeOnly", "location", "locality",
+        "postcode", "what3words", "locationDetails"
+    ]
+    earthquakes = earthquakes.drop(columns=columns_to_drop)
+    return earthquakes
+
+
+def prepare_earthquakes(raw):
+    """Process a raw CSV frame and compact its dtypes for serving."""
+    earthquakes = process_earthquakes(raw)
+    compact = compact_earthquakes(earthquakes)
+    if MEMORY_REPORT:
+        print("Earthquakes frame memory by column:")
+        print(memory_report(earthquakes, compact).to_string())
+    return compact
@@ -0,0 +1,125 @@
+"""Precomputed rankings for top-k outlier queries under the dashboard filters."""
+import copy
+
+import numpy as np
+
+# Columns the outlier cards and top lists rank by
+RANKED_COLUMNS = ("magnitude", "depth", "felt")
+
+
+class OutlierRanking:
+    """Row positions sorted by value, largest first, for each ranked column.
+
+    Ties keep the original row order and missing values are left out, so the
+    first k positions are the rows ``DataFrame.nlargest(k, column)`` picks
+    from the non-missing values.
+    A filter is answered by walking a ranking and keeping the positions that
+    are in the filter's sorted row set, stopping after k hits.
+
+    Rows appended later are ranked separately (see extended) and merged
+    into the top k, so the rankings are never copied.
+    """
+
+    def __init__(self, earthquakes, columns=RANKED_COLUMNS):
+        self._rankings = {}
+        # Negated values in ranking order (ascending), for merging in new rows
+        self._keys = {}
+        for column in columns:
+            self._rankings[column], self._keys[column] = _rank(earthquakes[column])
+        self._n_rows = len(earthquakes)
+        self._delta = None
+
+    def to_arrays(self):
+        """The arrays from_arrays rebuilds the rankings from, for snapshotting."""
+        arrays = {}
+        for column, ranking in self._rankings.items():
+            arrays[f"{column}_ranking"] = ranking
+            arrays[f"{column}_keys"] = self._keys[column]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, earthquakes, arrays):
+        """Rebuild the rankings of earthquakes from to_arrays() output."""
+        ranking = cls.__new__(cls)
+        columns = [name[:-len("_ranking")] for name in arrays if name.endswith("_ranking")]
+        ranking._rankings = {column: arrays[f"{column}_ranking"] for column in columns}
+        ranking._keys = {column: arrays[f"{column}_keys"] for column in columns}
+        ranking._n_rows = len(earthquakes)
+        ranking._delta = None
+        return ranking
+
+    def extended(self, earthquakes):
+        """Return the rankings of earthquakes, whose first rows are the ones ranked here.
+
+        The rows after those get rankings of their own, which top_k merges
+        with these; the result is the same as ranking earthquakes from
+        scratch.
+        """
+        ranking = copy.copy(self)
+        ranking._delta = None
+        if len(earthquakes) > self._n_rows:
+            ranking._delta = OutlierRanking(earthquakes.iloc[self._n_rows:], columns=tuple(self._rankings))
+        return ranking
+
+    def top_k(self, column, k, rows=None):
+        """Positions of the k largest values of column, largest first.
+
+        Args:
+            column: One of the ranked columns
+            k: Number of rows wanted
+            rows: Sorted row positions of the current filter, or None for all rows
+
+        Returns:
+            Array of at most k row positions
+        """
+        if self._delta is None:
+            return self._top(column, k, rows)[0]
+        if rows is None:
+            positions, keys = self._top(column, k, None)
+            added, added_keys = self._delta._top(column, k, None)
+        else:
+            split = np.searchsorted(rows, self._n_rows)
+            positions, keys = self._top(column, k, rows[:split])
+            added, added_keys = self._delta._top(column, k, rows[split:] - self._n_rows)
+        # Keys are negated values; on ties, a stable sort keeps the earlier rows first
+        order = np.argsort(np.concatenate([keys, added_keys]), kind="stable")[:k]
+        return np.concatenate([positions, added + self._n_rows])[order]
+
+    def _top(self, column, k, rows):
+        """top_k() over the rows ranked when this was built, with the keys of the positions found."""
+        ranking = self._rankings[column]
+        keys = self._keys[column]
+        if rows is None:
+            return ranking[:k], keys[:k]
+        if k <= 0 or len(rows) == 0:
+            return ranking[:0], keys[:0]
+
+        # Expect len(rows) / n_rows of each chunk to match, so size the first
+        # chunk to find about k hits and double it while more are needed
+        chunk = max(64, 2 * k * self._n_rows // len(rows))
+        found = [ranking[:0]]
+        found_keys = [keys[:0]]
+        n_found = 0
+        start = 0
+        while start < len(ranking) and n_found < k:
+            candidates = ranking[start:start + chunk]
+            idx = np.searchsorted(rows, candidates)
+            hit = idx < len(rows)
+            hit[hit] = rows[idx[hit]] == candidates[hit]
+            hits = np.flatnonzero(hit)[:k - n_found]
+            found.append(candidates[hits])
+            found_keys.append(keys[start:start + chunk][hits])
+            n_found += len(hits)
+            start += chunk
+            chunk *= 2
+        return np.concatenate(found), np.concatenate(found_keys)
+
+
+def _rank(column):
+    """Positions of the non-missing values, largest first, and their negated values."""
+    values = column.to_numpy(dtype=float)
+    present = np.flatnonzero(~np.isnan(values))
+    order = np.argsort(-values[present], kind="stable")
+    ranking = present[order]
+    ranking.setflags(write=False)
+    return ranking, -values[ranking]
@@ -2,6 +2,86 @@
 import plotly.graph_objects as go
 import numpy as np
 
+# Columns used for the correlation analysis
+NUMERIC_COLS = ['magnitude', 'depth', 'latitude', 'longitude']
+
+
+class CorrelationAccumulator:
+    """Mergeable sufficient statistics for pairwise Pearson correlations.
+
+    For every column pair (i, j) it keeps the number of rows where both
+    values are present, the mean and sum of squared deviations of column i
+    over those rows, and the co-moment of the pair. Chunks are summarized
+    around their own means and combined with the pairwise update of Chan et
+    al., which stays accurate for large catalogs where raw sums of squares
+    would lose precision. Missing values are skipped pairwise, like
+    DataFrame.corr().
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.count = np.zeros((k, k))
+        self.mean = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.comoment = np.zeros((k, k))
+
+    @classmethod
+    def from_chunks(cls, columns, chunks):
+        """Accumulate an iterable of DataFrames, e.g. read_csv(..., chunksize=n)."""
+        acc = cls(columns)
+        for chunk in chunks:
+            acc.update(chunk)
+        return acc
+
+    def update(self, frame):
+        """Add the rows of a DataFrame (appended rows or one chunk)."""
+        values = frame[self.columns].to_numpy(dtype=float)
+        valid = np.isfinite(values)
+        if not valid.any():
+            return self
+        # Center on the chunk's column means so the sums below stay small
+        with np.errstate(invalid="ignore"):
+            center = np.nanmean(np.where(valid, values, np.nan), axis=0)
+        centered = np.where(valid, values - np.nan_to_num(center), 0.0)
+        weights = valid.astype(float)
+
+        # [i, j] entries are taken over the rows where both i and j are present
+        count = weights.T @ weights
+        sums = centered.T @ weights
+        squares = (centered ** 2).T @ weights
+        products = centered.T @ centered
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, sums / count, 0.0)
+        chunk = CorrelationAccumulator(self.columns)
+        chunk.count = count
+        chunk.mean = mean + np.nan_to_num(center)[:, None]
+        chunk.m2 = squares - mean * sums
+        chunk.comoment = products - mean * sums.T
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Combine another accumulator over the same columns into this one."""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge correlation statistics over different columns")
+        count = self.count + other.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(count > 0, self.count * other.count / count, 0.0)
+            share = np.where(count > 0, other.count / count, 0.0)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * share
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.count = count
+        return self
+
+    def corr(self):
+        """Return the correlation matrix as a (k, k) array (NaN where undefined)."""
+        denom = np.sqrt(self.m2 * self.m2.T)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.where(denom > 0, self.comoment / denom, np.nan)
+        return np.clip(corr, -1.0, 1.0)
+
 
 def build_relation_graph(earthquakes):
     """Build a correlation heatmap showing relationships between earthquake variables.
@@ -12,11 +92,8 @@ def build_relation_graph(earthquakes):
     Returns:
         Plotly figure object with correlation heatmap
     """
-    df = earthquakes.copy()
-    
     # Select numeric columns for correlation analysis
-    numeric_cols = ['magnitude', 'depth', 'latitude', 'longitude']
-    available_cols = [col for col in numeric_cols if col in df.columns]
+    available_cols = [col for col in NUMERIC_COLS if col in earthquakes.columns]
     
     if len(available_cols) < 2:
         # Return empty figure if not enough numeric columns
@@ -27,17 +104,28 @@ def build_relation_graph(earthquakes):
         )
         return fig
     
-    # Calculate correlation matrix
-    corr_matrix = df[available_cols].corr()
+    return build_relation_graph_from_stats(CorrelationAccumulator(available_cols).update(earthquakes))
+
+
+def build_relation_graph_from_stats(stats):
+    """Build the correlation heatmap from a CorrelationAccumulator.
+    
+    Args:
+        stats: CorrelationAccumulator, e.g. merged from chunks or workers
+        
+    Returns:
+        Plotly figure object with correlation heatmap
+    """
+    corr_matrix = stats.corr()
     
     # Create heatmap
     fig = go.Figure(data=go.Heatmap(
-        z=corr_matrix.values,
-        x=available_cols,
-        y=available_cols,
+        z=corr_matrix,
+        x=stats.columns,
+        y=stats.columns,
         colorscale='RdBu_r',
         zmid=0,
-        text=np.round(corr_matrix.values, 2),
+        text=np.round(corr_matrix, 2),
         texttemplate='%{text}',
         textfont={"size": 12},
         hoverongaps=False,
@@ -0,0 +1,104 @@
+"""Process pool for CPU-heavy renders, so one session's render can't stall the others.
+
+matplotlib and Plotly figure building are CPU-bound and hold the GIL, so a
+thread wouldn't help; renders run in worker processes instead and the event
+loop awaits them. The pool is shared by all sessions of a Shiny worker.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from shiny.types import SafeException
+
+from config import RENDER_POOL_SIZE, RENDER_QUEUE_LIMIT
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+_warmed = False
+
+
+class RenderQueueFull(SafeException):
+    """Raised when RENDER_QUEUE_LIMIT renders are already waiting or running."""
+
+
+def get_pool():
+    """Return the process pool, starting it on first use (None if disabled)."""
+    global _pool
+    if RENDER_POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=RENDER_POOL_SIZE,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_warm_worker)
+    return _pool
+
+
+def warm():
+    """Start every pool worker now so the first render skips the start-up cost.
+
+    Safe to call more than once; only the first call in a process does anything.
+    """
+    global _warmed
+    if _warmed or multiprocessing.parent_process() is not None:
+        return
+    _warmed = True
+    pool = get_pool()
+    if pool is not None:
+        for _ in range(RENDER_POOL_SIZE):
+            pool.submit(_noop)
+
+
+async def run_in_pool(fn, *args):
+    """Run fn(*args) on the pool and return its result.
+
+    Runs inline when the pool is disabled. Cancelling the awaiting task
+    drops the render if it hasn't started yet; a render that has started
+    finishes in its worker and its result is discarded.
+
+    Raises:
+        RenderQueueFull: If RENDER_QUEUE_LIMIT renders are already pending
+    """
+    global _pending
+    pool = get_pool()
+    if pool is None:
+        return fn(*args)
+    with _pool_lock:
+        if _pending >= RENDER_QUEUE_LIMIT:
+            raise RenderQueueFull("The server is busy rendering, please try again shortly")
+        _pending += 1
+    future = pool.submit(fn, *args)
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+def figure_json(builder, *args):
+    """Build a Plotly figure and return its JSON; pass to run_in_pool to build it remotely."""
+    return builder(*args).to_json()
+
+
+def _release(_future):
+    global _pending
+    with _pool_lock:
+        _pending -= 1
+
+
+def _warm_worker():
+    """Pay matplotlib's import and font cache cost when a worker starts."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    importlib.import_module("plotly.express")
+
+    fig, ax = plt.subplots(figsize=(1, 1))
+    ax.set_xlabel("warm-up")
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _noop():
+    return None
@@ -1,26 +1,41 @@
-import plotly.express as px
+import numpy as np
+import plotly.graph_objects as go
 import pandas as pd
+from plotly.subplots import make_subplots
+
+from config import SPLOM_BIN_THRESHOLD, SPLOM_BINS, SPLOM_MAX_POINTS
+
+# Attributes shown in the matrix and their axis labels
+DIMENSIONS = ['magnitude', 'depth', 'felt']
+LABELS = {
+    'magnitude': 'Magnitude',
+    'depth': 'Depth',
+    'felt': 'Felt Reports',
+}
+
 
 def build_scatterplot_matrix(df: pd.DataFrame):
     """
     Create a scatterplot matrix (SPLOM) showing pairwise relations for key attributes.
-    Attributes: magnitude, depth, latitude, longitude, felt, alert, tsunami
+    Attributes: magnitude, depth, felt
+
+    The payload is capped by size: above SPLOM_MAX_POINTS rows a stratified
+    sample is plotted, and above SPLOM_BIN_THRESHOLD rows each panel is a
+    SPLOM_BINS x SPLOM_BINS density heatmap instead.
     """
-    # Select important columns (adjust as needed)
-    columns = [
-        'magnitude', 'depth', 'felt'
-    ]
+    import plotly.express as px
+
     # Filter out missing values for selected columns
-    df_filtered = df.dropna(subset=columns)
-    labels = {
-        'magnitude': 'Magnitude',
-        'depth': 'Depth',
-        'felt': 'Felt Reports',
-    }
+    df_filtered = df.dropna(subset=DIMENSIONS)
+    if len(df_filtered) > SPLOM_BIN_THRESHOLD:
+        return build_binned_scatterplot_matrix(df_filtered)
+    if len(df_filtered) > SPLOM_MAX_POINTS:
+        df_filtered = stratified_sample(df_filtered, SPLOM_MAX_POINTS)
+
     fig = px.scatter_matrix(
         df_filtered,
-        dimensions=['magnitude', 'depth', 'felt'],
-        labels=labels,
+        dimensions=DIMENSIONS,
+        labels=LABELS,
         title=""
     )
     fig.update_traces(diagonal_visible=False)
@@ -38,10 +53,10 @@ def build_scatterplot_matrix(df: pd.DataFrame):
                 if not fig.layout[axis].title.text:
                     fig.layout[axis].title.text = axis.replace('xaxis', '').capitalize() or 'Value'
     # Explicitly set axis titles for each subplot
-    for i, dim in enumerate(['magnitude', 'depth', 'felt'], start=1):
+    for i, dim in enumerate(DIMENSIONS, start=1):
         axis_name = f'xaxis{i}'
         if axis_name in fig.layout:
-            fig.layout[axis_name].title.text = labels[dim]
+            fig.layout[axis_name].title.text = LABELS[dim]
     fig.update_layout(
         margin=dict(l=40, r=20, t=0, b=80),
         autosize=False,
@@ -49,3 +64,86 @@ def build_scatterplot_matrix(df: pd.DataFrame):
         height=440
     )
     return fig
+
+
+def build_binned_scatterplot_matrix(df: pd.DataFrame):
+    """
+    Create the scatterplot matrix as 2D histograms binned on the server.
+    Each off-diagonal panel is a heatmap of event counts, so the figure size
+    depends only on SPLOM_BINS. Expects rows without missing values.
+    """
+    n = len(DIMENSIONS)
+    values = {dim: df[dim].to_numpy(dtype=float) for dim in DIMENSIONS}
+    edges = {dim: _bin_edges(values[dim], SPLOM_BINS) for dim in DIMENSIONS}
+
+    fig = make_subplots(rows=n, cols=n, shared_xaxes=True, shared_yaxes=True,
+                        horizontal_spacing=0.03, vertical_spacing=0.03)
+    for row, y_dim in enumerate(DIMENSIONS, start=1):
+        for col, x_dim in enumerate(DIMENSIONS, start=1):
+            if row == col:
+                # Diagonal panels stay empty, like the sampled matrix
+                continue
+            counts, _, _ = np.histogram2d(values[x_dim], values[y_dim],
+                                          bins=[edges[x_dim], edges[y_dim]])
+            fig.add_trace(go.Heatmap(
+                x=_bin_centers(edges[x_dim]),
+                y=_bin_centers(edges[y_dim]),
+                # Empty bins are left transparent
+                z=np.where(counts.T > 0, counts.T, np.nan),
+                coloraxis="coloraxis",
+                hovertemplate=(f"{LABELS[x_dim]}: %{{x:.3g}}<br>{LABELS[y_dim]}: %{{y:.3g}}"
+                               "<br>Events: %{z}<extra></extra>"),
+            ), row=row, col=col)
+
+    for i, dim in enumerate(DIMENSIONS, start=1):
+        fig.update_xaxes(title_text=LABELS[dim], range=[edges[dim][0], edges[dim][-1]], row=n, col=i)
+        fig.update_yaxes(title_text=LABELS[dim], range=[edges[dim][0], edges[dim][-1]], row=i, col=1)
+    fig.update_layout(
+        coloraxis=dict(colorscale="Blues", showscale=False),
+        margin=dict(l=40, r=20, t=0, b=80),
+        autosize=False,
+        width=440,
+        height=440
+    )
+    return fig
+
+
+def stratified_sample(df: pd.DataFrame, n, seed=0):
+    """
+    Sample about n rows with a fixed seed, stratified by magnitude category.
+    Every category keeps at least one row, and the rows holding the minimum
+    and maximum of each dimension are always kept so the axes don't shrink.
+    Rows keep their original order.
+    """
+    if 'magnitude_category' in df.columns:
+        strata, _ = pd.factorize(df['magnitude_category'])
+    else:
+        strata = np.zeros(len(df), dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(df)), strata))
+    sorted_strata = strata[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, len(df)])
+    rank = np.arange(len(df)) - np.repeat(starts, sizes)
+    # Proportional allocation per stratum
+    quota = np.maximum(1, np.round(sizes * n / len(df))).astype(np.int64)
+
+    keep = np.zeros(len(df), dtype=bool)
+    keep[order[rank < np.repeat(quota, sizes)]] = True
+    for dim in DIMENSIONS:
+        column = df[dim].to_numpy(dtype=float)
+        keep[[np.argmin(column), np.argmax(column)]] = True
+    return df[keep]
+
+
+def _bin_edges(values, bins):
+    """Equal-width bin edges over the range of values."""
+    lo, hi = values.min(), values.max()
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, bins + 1)
+
+
+def _bin_centers(edges):
+    return (edges[:-1] + edges[1:]) / 2
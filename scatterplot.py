@@ -1,10 +1,17 @@
 """Scatter plot visualization for earthquake magnitude vs depth."""
-import plotly.express as px
+import numpy as np
+import pandas as pd
+
+from config import SCATTER_DOWNSAMPLE_THRESHOLD, SCATTER_MAX_POINTS, SCATTER_WEBGL_THRESHOLD
 
 
 def build_scatterplot(data, color_var):
     """Build a scatter plot of magnitude vs depth.
 
+    Above SCATTER_WEBGL_THRESHOLD points the plot is drawn with WebGL, and
+    above SCATTER_DOWNSAMPLE_THRESHOLD it is thinned to about
+    SCATTER_MAX_POINTS points with thin_points.
+
     Args:
         data: DataFrame containing earthquake data with 'magnitude' and 'depth'
         color_var: Variable to use for coloring points ('none', 'magType', 'net')
@@ -12,7 +19,15 @@ def build_scatterplot(data, color_var):
     Returns:
         Plotly figure object
     """
+    import plotly.express as px
+
     color = None if color_var == "none" else color_var
+    render_mode = "webgl" if len(data) > SCATTER_WEBGL_THRESHOLD else "svg"
+    # Fix the color order from the full data so thinning can't shift colors
+    category_orders = {color: data[color].dropna().unique().tolist()} if color else None
+    if len(data) > SCATTER_DOWNSAMPLE_THRESHOLD:
+        data = thin_points(data, "magnitude", "depth", SCATTER_MAX_POINTS, group=color)
+
     fig = px.scatter(
         data,
         x="magnitude",
@@ -20,8 +35,78 @@ def build_scatterplot(data, color_var):
         color=color,
         opacity=0.7,
         labels={"magnitude": "Magnitude", "depth": "Depth (km)"},
+        category_orders=category_orders,
+        render_mode=render_mode,
     )
     fig.update_layout(
         margin={"l": 40, "r": 20, "t": 20, "b": 40},
     )
     return fig
+
+
+def thin_points(data, x, y, max_points, group=None, bins=100, seed=0):
+    """Downsample a scatter while keeping its density shape and outliers.
+
+    Points are binned on a bins x bins grid (separately per group, if given)
+    and every bin is capped at the same number of points, chosen so about
+    max_points remain. Sparse bins, which hold the outliers, are kept whole;
+    dense bins are randomly sampled with a fixed seed. The points with the
+    minimum and maximum x and y are always kept.
+
+    Returns:
+        The kept rows of data, in their original order
+    """
+    xs = data[x].to_numpy(dtype=float)
+    ys = data[y].to_numpy(dtype=float)
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    if finite.sum() <= max_points:
+        return data[finite]
+
+    key = _bin_codes(xs, finite, bins) * bins + _bin_codes(ys, finite, bins)
+    if group is not None:
+        codes, _ = pd.factorize(data[group])
+        key = key + (codes.astype(np.int64) + 1) * bins * bins
+    key[~finite] = -1
+
+    # Random order within each bin, then rank points inside their bin
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(key)), key))
+    sorted_keys = key[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    counts = np.diff(np.r_[starts, len(key)])
+    rank = np.arange(len(key)) - np.repeat(starts, counts)
+
+    finite_bins = sorted_keys[starts] >= 0
+    cap = _bin_cap(counts[finite_bins], max_points)
+    keep = np.zeros(len(key), dtype=bool)
+    keep[order[(rank < cap) & (sorted_keys >= 0)]] = True
+    # Spend what is left of the budget on one more point from some full bins
+    extra = np.flatnonzero((rank == cap) & (sorted_keys >= 0))
+    budget = max_points - int(np.minimum(counts[finite_bins], cap).sum())
+    if 0 < budget < len(extra):
+        extra = rng.choice(extra, budget, replace=False)
+    if budget > 0:
+        keep[order[extra]] = True
+    for values in (xs, ys):
+        masked = np.where(finite, values, np.nan)
+        keep[[np.nanargmin(masked), np.nanargmax(masked)]] = True
+    return data[keep]
+
+
+def _bin_codes(values, finite, bins):
+    """Equal-width bin number of each value over the finite values' range."""
+    lo, hi = values[finite].min(), values[finite].max()
+    scaled = (np.where(finite, values, lo) - lo) / ((hi - lo) or 1.0) * bins
+    return np.clip(scaled.astype(np.int64), 0, bins - 1)
+
+
+def _bin_cap(counts, max_points):
+    """Largest per-bin cap such that sum(min(counts, cap)) <= max_points."""
+    lo, hi = 1, int(counts.max())
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if np.minimum(counts, mid).sum() <= max_points:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
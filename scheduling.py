@@ -0,0 +1,66 @@
+"""Helpers that control when reactive work runs: debouncing and output priority."""
+import time
+
+from shiny import reactive
+from shiny.session import get_current_session
+
+
+def debounce(delay_secs):
+    """Decorator turning a function of inputs into a debounced reactive calc.
+
+    The calc only takes a new value once the function's result has stopped
+    changing for delay_secs, so dragging a slider recomputes its dependents
+    once when the drag pauses instead of for every intermediate value. A
+    settled value equal to the previous one doesn't invalidate dependents.
+    The first value is taken immediately.
+    """
+    def wrapper(f):
+        pending = reactive.calc(f)
+        settled = reactive.value()
+        deadline = reactive.value(None)
+
+        # These run before outputs (priority 0) in each flush
+        @reactive.effect(priority=102)
+        def _restart_timer():
+            value = pending()
+            with reactive.isolate():
+                if not settled.is_set():
+                    settled.set(value)
+                else:
+                    deadline.set(time.monotonic() + delay_secs)
+
+        @reactive.effect(priority=101)
+        def _settle():
+            due = deadline()
+            if due is None:
+                return
+            remaining = due - time.monotonic()
+            if remaining > 0:
+                reactive.invalidate_later(remaining)
+                return
+            with reactive.isolate():
+                deadline.set(None)
+                value = pending()
+                if value != settled():
+                    settled.set(value)
+
+        @reactive.calc
+        def debounced():
+            return settled()
+
+        return debounced
+    return wrapper
+
+
+def prioritize(priority):
+    """Decorator giving an Express render function an output priority.
+
+    Outputs with higher priority are computed first within a flush
+    (default 0), so light outputs can appear before heavy ones.
+    """
+    def wrapper(renderer):
+        session = get_current_session()
+        if session is None:
+            return renderer
+        return session.output(renderer, priority=priority)
+    return wrapper
@@ -1,4 +1,5 @@
 """Monthly and seasonal earthquake distribution chart."""
+import numpy as np
 import plotly.graph_objects as go
 
 
@@ -18,53 +19,37 @@ MONTH_TO_SEASON = {
     10: "Fall", 11: "Fall", 12: "Winter"
 }
 
+SEASONS = ["Winter", "Spring", "Summer", "Fall"]
+
+# Zero-based month indices of each season, in calendar order
+SEASON_MONTHS = {
+    season: np.array([m - 1 for m, s in MONTH_TO_SEASON.items() if s == season])
+    for season in SEASONS
+}
+
 MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
                "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
 
 
 def build_monthly_chart(earthquakes):
     """Build a bar chart of earthquakes by month, colored by season, with a donut chart overlay."""
-    df = earthquakes.copy()
-    # Use existing 'month_num' and 'season' columns if present, otherwise create them
-    if 'month_num' not in df.columns:
-        if 'datetime' in df.columns:
-            df['month_num'] = df['datetime'].dt.month
-        elif 'month' in df.columns:
-            df['month_num'] = df['month']
-        else:
-            raise ValueError("No 'month_num', 'month', or 'datetime' column found in DataFrame.")
-    if 'season' not in df.columns:
-        df['season'] = df['month_num'].apply(lambda x: MONTH_TO_SEASON[x])
-
-    # Count earthquakes per month
-    monthly_counts = df.groupby('month_num').size().reset_index(name='count')
-
-    # Add month names and seasons (use existing if present)
-    monthly_counts['month'] = monthly_counts['month_num'].apply(lambda x: MONTH_NAMES[x-1])
-    if 'season' in df.columns:
-        monthly_counts['season'] = monthly_counts['month_num'].map(df.drop_duplicates('month_num').set_index('month_num')['season'])
-    else:
-        monthly_counts['season'] = monthly_counts['month_num'].apply(lambda x: MONTH_TO_SEASON[x])
-
-    # Sort by month number
-    monthly_counts = monthly_counts.sort_values('month_num')
+    # Count earthquakes per month in one pass; index 0 is month 1 (Jan)
+    monthly_counts = np.bincount(_month_numbers(earthquakes), minlength=13)[1:13]
+    present = monthly_counts > 0
 
-    # Calculate seasonal totals for donut chart
-    seasonal_counts = monthly_counts.groupby('season')['count'].sum().reset_index()
-    # Order seasons correctly
-    season_order = ["Winter", "Spring", "Summer", "Fall"]
-    seasonal_counts['order'] = seasonal_counts['season'].apply(lambda x: season_order.index(x))
-    seasonal_counts = seasonal_counts.sort_values('order')
+    # Seasonal totals for the donut chart, in season order
+    season_counts = {season: int(monthly_counts[SEASON_MONTHS[season]].sum())
+                     for season in SEASONS if present[SEASON_MONTHS[season]].any()}
 
     # Create figure
     fig = go.Figure()
 
     # Add bar traces
-    for season in ["Winter", "Spring", "Summer", "Fall"]:
-        season_data = monthly_counts[monthly_counts['season'] == season]
+    for season in SEASONS:
+        months = SEASON_MONTHS[season][present[SEASON_MONTHS[season]]]
         fig.add_trace(go.Bar(
-            x=season_data['month'],
-            y=season_data['count'],
+            x=[MONTH_NAMES[m] for m in months],
+            y=monthly_counts[months],
             name=season,
             marker_color=SEASON_COLORS[season],
             hovertemplate="<b>%{x}</b><br>Earthquakes: %{y}<br>Season: " + season + "<extra></extra>",
@@ -75,10 +60,10 @@ def build_monthly_chart(earthquakes):
 
     # Add donut chart as a pie trace with domain positioning (inside bar chart, top left)
     fig.add_trace(go.Pie(
-        labels=seasonal_counts['season'],
-        values=seasonal_counts['count'],
+        labels=list(season_counts),
+        values=list(season_counts.values()),
         hole=0.5,
-        marker_colors=[SEASON_COLORS[s] for s in seasonal_counts['season']],
+        marker_colors=[SEASON_COLORS[s] for s in season_counts],
         domain=dict(x=[0.02, 0.25], y=[0.5, 0.95]),
         textinfo='percent',
         textfont=dict(size=9),
@@ -119,7 +104,7 @@ def build_monthly_chart(earthquakes):
     )
 
     # Add highlight box for Jul-Sep
-    max_count = monthly_counts['count'].max()
+    max_count = monthly_counts[present].max() if present.any() else np.nan
     fig.add_vrect(
         x0=5.5, x1=8.5,  # Numeric positions: between Jun(5) and Jul(6), between Sep(8) and Oct(9)
         fillcolor="rgba(245, 158, 11, 0.15)",  # Light orange
@@ -138,3 +123,23 @@ def build_monthly_chart(earthquakes):
     )
 
     return fig
+
+
+def _month_numbers(earthquakes):
+    """Month numbers (1-12) of the events, without copying the frame.
+
+    Uses the 'month_num' or 'month' column if present, otherwise derives
+    them from 'datetime'. Missing months are skipped.
+    """
+    if 'month_num' in earthquakes.columns:
+        months = earthquakes['month_num']
+    elif 'month' in earthquakes.columns:
+        months = earthquakes['month']
+    elif 'datetime' in earthquakes.columns:
+        months = earthquakes['datetime'].dt.month
+    else:
+        raise ValueError("No 'month_num', 'month', or 'datetime' column found in DataFrame.")
+    months = months.to_numpy()
+    if months.dtype.kind == 'f':
+        months = months[~np.isnan(months)]
+    return months.astype(np.intp, copy=False)
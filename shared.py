@@ -1,54 +1,287 @@
-"""Shared data loading and processing for earthquake dashboard."""
+"""Shared data loading for earthquake dashboard.
+
+Importing this module starts loading the dataset on a background thread;
+reading one of DATA_NAMES from it waits for the load to finish. The
+dataset can grow afterwards (see ingest.py): events are appended to the
+snapshot, and every process serving it checks the snapshot's version
+every DATA_POLL_SECS and publishes the new rows as a new Dataset with a
+higher data_version.
+"""
+import inspect
 import os
+import threading
+import time
 from pathlib import Path
+from typing import NamedTuple
 
-import kagglehub  # type: ignore
 import pandas as pd
 
+from config import CACHE_DIR, DATA_POLL_SECS, DATASET_CSV, OFFLINE, SNAPSHOT_ENABLED
+from cube import CategoryCube
+from filter_index import FilterIndex
+import memory
+from processing import prepare_earthquakes, process_earthquakes
+from ranking import OutlierRanking
+from table import TablePager
+from snapshot import (content_key, load_arrays, load_or_build, load_snapshot, save_arrays,
+                      set_snapshot_attrs, snapshot_version, source_key)
+
 app_dir = Path(__file__).parent
 
-# Download earthquakes dataset from Kaggle
-path = kagglehub.dataset_download("shreyasur965/recent-earthquakes")
-csv_file = os.path.join(path, "earthquakes.csv")
-earthquakes = pd.read_csv(csv_file)
-
-# --------------------------------------------------------
-# Data processing
-# --------------------------------------------------------
-
-# Convert time to datetime (time is in milliseconds since epoch)
-earthquakes['datetime'] = pd.to_datetime(earthquakes['time'], unit='ms')
-
-# Make new columns for month and season
-earthquakes['month'] = earthquakes['datetime'].dt.month
-earthquakes['season'] = earthquakes['month'] % 12 // 3 + 1
-season_mapping = {1: 'Winter', 2: 'Spring', 3: 'Summer', 4: 'Fall'}
-earthquakes['season'] = earthquakes['season'].map(season_mapping)
-
-# Categoerize magnitude to small, medium, large in new column
-earthquakes['magnitude_category'] = pd.cut(
-    earthquakes['magnitude'],
-    bins=[-float('inf'), 4.0, 6.0, float('inf')],
-    labels=['Small', 'Medium', 'Large'])
-
-# Categorize depth to shallow, intermediate, deep in new column
-earthquakes['depth_category'] = pd.cut(
-    earthquakes['depth'],
-    bins=[-float('inf'), 70.0, 300.0, float('inf')],
-    labels=['Shallow', 'Intermediate', 'Deep'])
-
-# Filter out rows with missing values in key columns
-earthquakes = earthquakes.dropna(subset=['magnitude', 'depth', 'latitude', 'longitude'])
-earthquakes = earthquakes.reset_index(drop=True) # Reset index after filtering
-
-# Delete duplicate rows based on 'id' column
-earthquakes = earthquakes.drop_duplicates(subset=['id'])
-
-
-# Remove unnecessary columns
-columns_to_drop = [
-    "type", "updated", "url", "detailUrl", "status", "code", "sources",
-    "types", "rms", "geometryType", "placeOnly", "location", "locality",
-    "postcode", "what3words", "locationDetails"
-]
-earthquakes = earthquakes.drop(columns=columns_to_drop)
+# Bump to invalidate existing snapshots when processing changes outside
+# process_earthquakes (e.g. in pandas behaviour we rely on)
+PROCESSING_VERSION = 1
+
+
+def load_earthquakes(csv_file):
+    """Return the processed earthquakes frame for a CSV file.
+
+    The processed frame is snapshotted under CACHE_DIR, keyed by the CSV's
+    hash and the processing code, so later starts skip the pipeline in
+    processing.py.
+    Worker processes memory-map the same snapshot files, so they share one
+    copy of the column data, and only the first of them builds it.
+    """
+    if not SNAPSHOT_ENABLED:
+        return prepare_earthquakes(pd.read_csv(csv_file))
+
+    def build():
+        data = prepare_earthquakes(pd.read_csv(csv_file))
+        # Rows covered by the snapshotted indexes; see _snapshot_dataset
+        data.attrs["index_rows"] = len(data)
+        return data
+
+    return load_or_build(_snapshot_dir(csv_file), build)
+
+
+def load_dataset(csv_file):
+    """Return the Dataset for a CSV file: the processed frame and its indexes.
+
+    With snapshots enabled, the index arrays are snapshotted next to the
+    frame, and both are memory-mapped, so worker processes share them
+    instead of each sorting and binning the rows. The table's sort orders
+    are saved in the same directory as sessions first ask for them.
+    """
+    if not SNAPSHOT_ENABLED:
+        data = load_earthquakes(csv_file)
+        index = FilterIndex(data)
+        return Dataset(data, index, CategoryCube(data, index), OutlierRanking(data),
+                       TablePager(data), version=0)
+    return _snapshot_dataset(_snapshot_dir(csv_file), load_earthquakes(csv_file))
+
+
+def reindex(snapshot_dir):
+    """Rebuild a snapshot's indexes over all its rows.
+
+    Until then, rows appended to the snapshot are indexed separately in
+    every process (see FilterIndex.extended), which gets slower and takes
+    more memory as they add up. Hold snapshot_lock(snapshot_dir) while
+    calling this.
+    """
+    data = load_snapshot(snapshot_dir)
+    load_or_build(_index_dir(snapshot_dir, len(data)), lambda: _index_arrays(data),
+                  load=load_arrays, save=save_arrays)
+    set_snapshot_attrs(snapshot_dir, index_rows=len(data))
+
+
+def refresh():
+    """Publish the snapshot's latest version if events were appended to it since.
+
+    Returns:
+        Whether a new Dataset was published
+    """
+    if _snapshot_path is None:
+        return False
+    with _refresh_lock:
+        version = snapshot_version(_snapshot_path)
+        if version is None or version == _current.version:
+            return False
+        data = load_snapshot(_snapshot_path)
+        if data is None:
+            return False
+        publish(_snapshot_dataset(_snapshot_path, data))
+        return True
+
+
+def snapshot_directory():
+    """Snapshot directory of the served dataset, or None with snapshots disabled."""
+    wait_until_loaded()
+    return _snapshot_path
+
+
+def _snapshot_dataset(snapshot_dir, data):
+    """Dataset over a snapshot frame, with indexes memory-mapped from the snapshot.
+
+    The snapshotted indexes cover the rows the frame had when they were
+    last rebuilt (see reindex). They are loaded once per rebuild, and rows
+    appended after them are indexed by the extended() methods.
+    """
+    global _indexes
+    rows = data.attrs.get("index_rows", len(data))
+    if _indexes is None or _indexes[0] != (snapshot_dir, rows):
+        index_dir = _index_dir(snapshot_dir, rows)
+        base = data.iloc[:rows]
+        arrays = load_or_build(index_dir, lambda: _index_arrays(base),
+                               load=load_arrays, save=save_arrays)
+        parts = {}
+        for name, values in arrays.items():
+            prefix, name = name.split(".", 1)
+            parts.setdefault(prefix, {})[name] = values
+        index = FilterIndex.from_arrays(base, parts["filter"])
+        _indexes = ((snapshot_dir, rows), index, CategoryCube.from_arrays(base, index, parts["cube"]),
+                    OutlierRanking.from_arrays(base, parts["ranking"]), index_dir)
+    _, index, heatmap_cube, outlier_ranking, index_dir = _indexes
+    if len(data) > rows:
+        index = index.extended(data)
+        heatmap_cube = heatmap_cube.extended(data, index)
+        outlier_ranking = outlier_ranking.extended(data)
+    return Dataset(data, index, heatmap_cube, outlier_ranking,
+                   TablePager(data, index_dir if index_dir.is_dir() else None),
+                   version=data.attrs.get("snapshot_version", 0))
+
+
+def _index_arrays(data):
+    """Build the indexes over a frame and return their arrays, for save_arrays."""
+    index = FilterIndex(data)
+    arrays = {}
+    for prefix, part in (("filter", index), ("cube", CategoryCube(data, index)),
+                         ("ranking", OutlierRanking(data))):
+        arrays.update({f"{prefix}.{name}": values for name, values in part.to_arrays().items()})
+    return arrays
+
+
+def _index_dir(snapshot_dir, rows):
+    """Directory of the indexes over the first rows of a snapshot, keyed by the index code."""
+    code = "\n".join(inspect.getsource(inspect.getmodule(cls))
+                     for cls in (FilterIndex, CategoryCube, OutlierRanking, TablePager))
+    return snapshot_dir / f"indexes-{content_key(str(rows), code)}"
+
+
+def _snapshot_dir(csv_file):
+    """Snapshot directory of the processed frame for a CSV file.
+
+    The CSV's key is kept in a manifest, so workers started after the first
+    one don't hash the whole file again.
+    """
+    # The frame's dtypes and categories depend on all of memory.py, not just compact_earthquakes
+    code_version = "\n".join([str(PROCESSING_VERSION), inspect.getsource(process_earthquakes),
+                              inspect.getsource(prepare_earthquakes), inspect.getsource(memory)])
+    key = source_key(csv_file, code_version, CACHE_DIR / "earthquakes.manifest.json")
+    return CACHE_DIR / f"earthquakes-{key}"
+
+
+def dataset_csv():
+    """Return the earthquakes CSV path, downloading it from Kaggle unless configured."""
+    if DATASET_CSV:
+        return DATASET_CSV
+    if OFFLINE:
+        raise RuntimeError("EARTHQUAKE_OFFLINE is set, so EARTHQUAKE_CSV must point to the dataset")
+    import kagglehub  # type: ignore
+
+    # Download earthquakes dataset from Kaggle
+    path = kagglehub.dataset_download("shreyasur965/recent-earthquakes")
+    return os.path.join(path, "earthquakes.csv")
+
+
+# Module attributes read from the published Dataset (and csv_file), e.g.
+# shared.earthquakes; data_version is the Dataset's version
+DATA_NAMES = ("csv_file", "earthquakes", "filter_index", "heatmap_cube", "outlier_ranking",
+              "table_pager", "data_version")
+
+_loader = None
+_loader_lock = threading.Lock()
+_load_error = None
+_publish_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+class Dataset(NamedTuple):
+    """The earthquakes frame and the indexes built over it, at one data version."""
+    earthquakes: pd.DataFrame
+    filter_index: FilterIndex
+    heatmap_cube: CategoryCube
+    outlier_ranking: OutlierRanking
+    table_pager: TablePager
+    version: int
+
+
+# The Dataset served to sessions, set by publish()
+_current: Dataset | None = None
+_csv_file = None
+# Snapshot the dataset was loaded from (None with snapshots disabled), and
+# ((snapshot, rows), FilterIndex, CategoryCube, OutlierRanking, directory)
+# for the snapshotted indexes over its first rows
+_snapshot_path = None
+_indexes = None
+
+
+def current_dataset():
+    """Return the latest Dataset, waiting for the initial load if needed."""
+    wait_until_loaded()
+    return _current
+
+
+def publish(dataset):
+    """Make dataset the one served to sessions (they pick it up by polling data_version)."""
+    global _current
+    with _publish_lock:
+        _current = dataset
+
+
+def start_loading():
+    """Start loading the dataset on a background thread, if not started yet.
+
+    The app imports its other modules and starts the render pool while the
+    CSV is downloaded and the snapshot loaded.
+    """
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            _loader = threading.Thread(target=_load, name="dataset-loader", daemon=True)
+            _loader.start()
+
+
+def wait_until_loaded():
+    """Block until the dataset is loaded; re-raises the loader's error, if any."""
+    start_loading()
+    _loader.join()
+    if _load_error is not None:
+        raise _load_error
+
+
+def _load():
+    global _csv_file, _load_error, _snapshot_path
+    try:
+        _csv_file = dataset_csv()
+        publish(load_dataset(_csv_file))
+    except BaseException as e:
+        _load_error = e
+        return
+    if SNAPSHOT_ENABLED:
+        _snapshot_path = _snapshot_dir(_csv_file)
+        threading.Thread(target=_watch, name="dataset-watcher", daemon=True).start()
+
+
+def _watch():
+    """Publish events other processes append to the snapshot, every DATA_POLL_SECS."""
+    while True:
+        time.sleep(DATA_POLL_SECS)
+        try:
+            refresh()
+        except Exception as e:
+            print(f"Could not refresh the dataset: {e}")
+
+
+def __getattr__(name):
+    # DATA_NAMES aren't module variables; read them from the current Dataset
+    if name not in DATA_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    wait_until_loaded()
+    if name == "csv_file":
+        return _csv_file
+    if name == "data_version":
+        return _current.version
+    return getattr(_current, name)
+
+
+start_loading()
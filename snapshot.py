@@ -0,0 +1,579 @@
+"""Columnar on-disk snapshots of the processed earthquake frame.
+
+A snapshot is a directory with raw binary files for each column plus a
+``meta.json`` describing how to rebuild the frame. Every file is
+memory-mapped on load, so a warm start only touches the pages that are
+actually used:
+
+- numeric and datetime columns are stored as they are;
+- categorical columns as integer codes, with their categories kept in
+  the metadata;
+- other text columns as the offsets, character data and validity buffers
+  of an Arrow string array, which pandas wraps without copying. Without
+  pyarrow they are dictionary-encoded like categoricals instead and
+  decoded into Python strings on load.
+
+Memory-mapped pages live in the OS page cache, so several worker processes
+loading the same snapshot share one copy of the column data. snapshot_lock
+lets one of them build a missing snapshot while the others wait for it.
+save_arrays/load_arrays do the same for the index arrays built over the
+frame, and source_key lets workers find the snapshot without hashing the
+CSV again.
+
+append_snapshot adds rows in place. Column files are allocated (sparsely)
+with room to grow, so an append only writes the new rows; a file is copied
+to a bigger one when it fills up, doubling its capacity. meta.json, which
+says how many rows are valid, is replaced last and carries a version that
+other processes poll (snapshot_version) to pick up the new rows.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, workers may build in parallel
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # text columns are decoded into Python strings instead
+    pa = None
+
+SNAPSHOT_FORMAT = 3
+
+# Smallest number of items a column file is allocated for
+MIN_CAPACITY = 1024
+
+if pa is not None:
+    try:
+        # NaN for missing values, like the object columns it replaces
+        TEXT_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:  # pandas < 2.3
+        TEXT_DTYPE = pd.StringDtype("pyarrow")
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_key(csv_file, code_version):
+    """Return a short key identifying the source file and processing code."""
+    return content_key(file_digest(csv_file), code_version)
+
+
+def content_key(source, code_version):
+    """Return a short key identifying a source (e.g. a file digest or URL) and processing code."""
+    digest = hashlib.sha256()
+    digest.update(f"format={SNAPSHOT_FORMAT}\n".encode())
+    digest.update(source.encode())
+    digest.update(code_version.encode())
+    return digest.hexdigest()[:16]
+
+
+def source_key(path, code_version, manifest):
+    """Return snapshot_key(path, code_version), hashing the file only when it changed.
+
+    The key is recorded in the manifest file together with the source's
+    path, size and modification time. While those match, the recorded key
+    is returned, so worker processes started after the first one find the
+    snapshot without reading the whole CSV.
+    """
+    stat = os.stat(path)
+    source = {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "code": hashlib.sha256(f"format={SNAPSHOT_FORMAT}\n{code_version}".encode()).hexdigest(),
+    }
+    try:
+        with open(manifest) as f:
+            recorded = json.load(f)
+        if recorded["source"] == source:
+            return recorded["key"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    key = snapshot_key(path, code_version)
+    try:
+        os.makedirs(os.path.dirname(manifest), exist_ok=True)
+        _write_json(manifest, {"source": source, "key": key})
+    except OSError as e:
+        print(f"Could not write snapshot manifest {manifest}: {e}")
+    return key
+
+
+@contextlib.contextmanager
+def snapshot_lock(directory):
+    """Hold an exclusive cross-process lock for building a snapshot directory."""
+    directory = os.fspath(directory)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(directory + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_or_build(directory, build, load=None, save=None):
+    """Load the snapshot in directory, or build and save it if missing.
+
+    Only one process builds at a time; processes that waited for the lock
+    load the snapshot the builder wrote. If the snapshot can't be written,
+    the built value is returned anyway.
+
+    Args:
+        directory: Snapshot directory
+        build: Function returning the frame (or whatever save accepts)
+        load: Function reading the directory, returning None if it's
+            missing or invalid (default load_snapshot)
+        save: Function writing the built value to the directory (default
+            save_snapshot)
+    """
+    load = load or load_snapshot
+    save = save or save_snapshot
+    value = load(directory)
+    if value is not None:
+        return value
+    with snapshot_lock(directory):
+        value = load(directory)
+        if value is not None:
+            return value
+        value = build()
+        try:
+            save(value, directory)
+        except OSError as e:
+            print(f"Could not write snapshot {directory}: {e}")
+            return value
+    # Serve the memory-mapped copy so this process shares pages with the others
+    mapped = load(directory)
+    return value if mapped is None else mapped
+
+
+def save_snapshot(frame, directory):
+    """Write a frame to a snapshot directory.
+
+    The snapshot is written to a temporary sibling directory and renamed into
+    place, so readers never see a partial snapshot. Older snapshots next to
+    it with the same name prefix are removed. The frame's attrs are saved
+    too and must be JSON-serializable.
+    """
+    def write(tmp_dir):
+        columns = []
+        for i, name in enumerate(frame.columns):
+            columns.append(_save_column(frame[name], tmp_dir, f"{i}-0"))
+            columns[-1]["name"] = name
+        index = _save_buffer(frame.index.to_numpy(), tmp_dir, "index-0.bin")
+        _write_json(os.path.join(tmp_dir, "meta.json"), {
+            "format": SNAPSHOT_FORMAT, "rows": len(frame), "version": 0,
+            "columns": columns, "index": index, "attrs": dict(frame.attrs),
+        })
+
+    _write_directory(directory, write)
+
+
+def load_snapshot(directory):
+    """Load a snapshot written by save_snapshot, or return None if missing/invalid.
+
+    The frame's attrs are the saved ones, updated by set_snapshot_attrs,
+    plus the snapshot's version under "snapshot_version".
+    """
+    directory = os.fspath(directory)
+    meta = _read_meta(directory, "meta.json")
+    if meta is None:
+        return None
+    try:
+        rows = meta["rows"]
+        data = {col["name"]: _load_column(col, directory, rows) for col in meta["columns"]}
+        index = pd.Index(_load_buffer(meta["index"], directory, rows))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable dataset snapshot {directory}: {e}")
+        return None
+    frame = pd.DataFrame(data, index=index, copy=False)
+    frame.attrs.update(meta["attrs"])
+    frame.attrs["snapshot_version"] = meta["version"]
+    return frame
+
+
+def snapshot_version(directory):
+    """Version of a snapshot (0 when saved, then one more per change), or None if missing."""
+    meta = _read_meta(os.fspath(directory), "meta.json")
+    return None if meta is None else meta["version"]
+
+
+def append_snapshot(directory, batch):
+    """Append the rows of a frame to a snapshot written by save_snapshot.
+
+    Only the batch is written. Its values are converted to the stored
+    column types; categoricals gain new categories, and a column whose
+    values no longer fit its dtype (e.g. missing values in an integer
+    column) is copied to a wider one. Columns missing from the batch are
+    filled with missing values. The batch's index labels continue the
+    snapshot's.
+
+    Hold snapshot_lock(directory) while calling this. Readers see either
+    the old or the new rows: files written for the previous version are
+    kept until the next append.
+
+    Returns:
+        The snapshot's new version
+    """
+    directory = os.fspath(directory)
+    meta = _read_meta(directory, "meta.json")
+    if meta is None:
+        raise ValueError(f"No snapshot to append to in {directory}")
+    rows = meta["rows"]
+    version = meta["version"] + 1
+    columns = []
+    for i, col in enumerate(meta["columns"]):
+        values = batch[col["name"]] if col["name"] in batch else pd.Series(np.nan, index=batch.index)
+        columns.append(_append_column(col, values, directory, rows, f"{i}-{version}"))
+    index = meta["index"]
+    if rows:
+        start = int(_load_buffer(index, directory, rows)[-1]) + 1
+    else:
+        start = 0
+    labels = np.arange(start, start + len(batch), dtype=index["dtype"])
+    index = _append_buffer(index, labels, directory, rows, f"index-{version}.bin")
+    _replace_meta(directory, meta, dict(meta, rows=rows + len(batch), version=version,
+                                        columns=columns, index=index))
+    return version
+
+
+def set_snapshot_attrs(directory, **attrs):
+    """Store small JSON values with a snapshot, returned in the loaded frame's attrs.
+
+    Counts as a change: the snapshot's version goes up. Hold
+    snapshot_lock(directory) while calling this.
+    """
+    directory = os.fspath(directory)
+    meta = _read_meta(directory, "meta.json")
+    if meta is None:
+        raise ValueError(f"No snapshot in {directory}")
+    _replace_meta(directory, meta, dict(meta, attrs=dict(meta["attrs"], **attrs),
+                                        version=meta["version"] + 1))
+
+
+def save_arrays(arrays, directory):
+    """Write a dict of name -> NumPy array to a directory, like save_snapshot."""
+    def write(tmp_dir):
+        entries = {}
+        for i, (name, values) in enumerate(arrays.items()):
+            values = np.ascontiguousarray(values)
+            values.tofile(os.path.join(tmp_dir, f"{i}.bin"))
+            entries[name] = {"file": f"{i}.bin", "dtype": values.dtype.str, "shape": values.shape}
+        _write_json(os.path.join(tmp_dir, "arrays.json"),
+                    {"format": SNAPSHOT_FORMAT, "arrays": entries})
+
+    _write_directory(directory, write)
+
+
+def load_arrays(directory):
+    """Memory-map the arrays written by save_arrays (read-only), or return None."""
+    directory = os.fspath(directory)
+    meta = _read_meta(directory, "arrays.json")
+    if meta is None:
+        return None
+    try:
+        return {
+            name: _map(os.path.join(directory, entry["file"]), entry["dtype"], tuple(entry["shape"]))
+            for name, entry in meta["arrays"].items()
+        }
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable snapshot arrays {directory}: {e}")
+        return None
+
+
+def save_array(values, path):
+    """Write one array as a raw file, atomically; read it back with load_array."""
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.ascontiguousarray(values).tofile(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def load_array(path, dtype, shape):
+    """Memory-map a file written by save_array, or return None if it's missing or the wrong size."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    if size != np.dtype(dtype).itemsize * int(np.prod(shape)):
+        return None
+    return _map(path, dtype, shape)
+
+
+def _save_column(series, directory, name):
+    """Save one column as name.* files in directory and return its metadata entry."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = _save_buffer(series.cat.codes.to_numpy(), directory, name + ".codes")
+        return {"kind": "category", "codes": codes,
+                "categories": series.cat.categories.tolist(), "ordered": bool(dtype.ordered)}
+    if dtype.kind in "biufmM":
+        return {"kind": "array", "values": _save_buffer(series.to_numpy(), directory, name + ".values")}
+    if pa is not None:
+        try:
+            text = pa.array(series.to_numpy(dtype=object), type=pa.large_string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass  # not all strings: dictionary-encode below
+        else:
+            offsets, data, valid = _text_buffers(text, 0)
+            return {"kind": "text",
+                    "offsets": _save_buffer(offsets, directory, name + ".offsets"),
+                    "data": _save_buffer(data, directory, name + ".data"),
+                    "valid": _save_buffer(valid, directory, name + ".valid"),
+                    "bytes": len(data), "nulls": text.null_count}
+    # Strings without pyarrow and other objects: dictionary-encode, -1 marks missing values
+    codes, uniques = pd.factorize(series)
+    codes = _save_buffer(codes.astype(_code_dtype(len(uniques))), directory, name + ".codes")
+    return {"kind": "encoded", "codes": codes, "categories": uniques.tolist(), "dtype": str(dtype)}
+
+
+def _load_column(col, directory, rows):
+    """Rebuild one column from its metadata entry and memory-mapped files."""
+    kind = col["kind"]
+    if kind == "array":
+        return _load_buffer(col["values"], directory, rows)
+    if kind == "text":
+        if pa is None:
+            raise ValueError("text columns need pyarrow")
+        buffers = [pa.py_buffer(_load_buffer(col["valid"], directory, (rows + 7) // 8)),
+                   pa.py_buffer(_load_buffer(col["offsets"], directory, rows + 1)),
+                   pa.py_buffer(_load_buffer(col["data"], directory, col["bytes"]))]
+        text = pa.Array.from_buffers(pa.large_string(), rows, buffers, null_count=col["nulls"])
+        return pd.array(text, dtype=TEXT_DTYPE)
+    codes = _load_buffer(col["codes"], directory, rows)
+    values = pd.Categorical.from_codes(codes, categories=col["categories"],
+                                       ordered=col.get("ordered", False))
+    if kind == "category":
+        return values
+    return pd.Series(values).astype(col["dtype"]).array
+
+
+def _append_column(col, values, directory, rows, name):
+    """Write a batch of values after the first rows of a column; returns its new entry."""
+    kind = col["kind"]
+    if kind == "array":
+        stored = _array_values(np.dtype(col["values"]["dtype"]), values)
+        return dict(col, values=_append_buffer(col["values"], stored, directory, rows, name + ".values"))
+    if kind == "text":
+        strings = [None if pd.isna(v) else str(v) for v in values]
+        text = pa.array(strings, type=pa.large_string())
+        offsets, data, valid = _text_buffers(text, col["bytes"])
+        # The first validity byte may hold bits of existing rows; rewrite it with them
+        kept = rows % 8
+        if kept:
+            first = _load_buffer(col["valid"], directory, rows // 8 + 1)[-1:]
+            old_bits = np.unpackbits(first, bitorder="little")[:kept].astype(bool)
+            valid = np.packbits(np.concatenate([old_bits, np.asarray(text.is_valid())]),
+                                bitorder="little")
+        return dict(
+            col,
+            offsets=_append_buffer(col["offsets"], offsets[1:], directory, rows + 1, name + ".offsets"),
+            data=_append_buffer(col["data"], data, directory, col["bytes"], name + ".data"),
+            valid=_append_buffer(col["valid"], valid, directory, rows // 8, name + ".valid"),
+            bytes=col["bytes"] + len(data), nulls=col["nulls"] + text.null_count)
+    categories = list(col["categories"])
+    known = set(categories)
+    for value in pd.unique(values.dropna()):
+        if value not in known:
+            categories.append(value.item() if isinstance(value, np.generic) else value)
+            known.add(value)
+    codes = pd.Categorical(values, categories=categories).codes
+    dtype = np.promote_types(col["codes"]["dtype"], _code_dtype(len(categories)))
+    return dict(col, categories=categories,
+                codes=_append_buffer(col["codes"], codes.astype(dtype), directory, rows, name + ".codes"))
+
+
+def _array_values(dtype, values):
+    """A batch of values as an array for a column of dtype, widened if they don't fit it."""
+    if dtype.kind in "mM":
+        return pd.to_datetime(values).to_numpy(dtype=dtype)
+    numbers = pd.to_numeric(values).to_numpy()
+    if dtype.kind in "iu":
+        if numbers.dtype.kind == "f":
+            if np.isnan(numbers).any() or (numbers != np.round(numbers)).any():
+                return numbers.astype(np.float64)
+            numbers = numbers.astype(np.int64)
+        if len(numbers):
+            dtype = _fitting_int(dtype, int(numbers.min()), int(numbers.max()))
+    return numbers.astype(dtype)
+
+
+def _fitting_int(dtype, low, high):
+    """dtype if it holds low..high, else the smallest signed integer type at least as wide that does."""
+    info = np.iinfo(dtype)
+    if info.min <= low and high <= info.max:
+        return dtype
+    for wider in (np.int16, np.int32, np.int64):
+        info = np.iinfo(wider)
+        if np.dtype(wider).itemsize > dtype.itemsize and info.min <= low and high <= info.max:
+            return np.dtype(wider)
+    return np.dtype(np.int64)
+
+
+def _text_buffers(text, start):
+    """Offsets (shifted to start at byte start), character data and validity bits of an Arrow string array."""
+    validity, offsets, data = text.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64, count=len(text) + 1)
+    n_bytes = int(offsets[-1] - offsets[0])
+    data = (np.frombuffer(data, dtype=np.uint8, count=n_bytes, offset=int(offsets[0]))
+            if n_bytes else np.empty(0, dtype=np.uint8))
+    valid = np.packbits(np.asarray(text.is_valid()), bitorder="little")
+    return offsets - offsets[0] + start, data, valid
+
+
+def _save_buffer(values, directory, file):
+    """Write an array to a new file with room to grow; returns its metadata entry."""
+    values = np.ascontiguousarray(values)
+    capacity = _capacity(len(values))
+    with open(os.path.join(directory, file), "wb") as f:
+        values.tofile(f)
+        # Sparse: the room to grow takes no disk space until it's written
+        f.truncate(capacity * values.dtype.itemsize)
+    return {"file": file, "dtype": values.dtype.str, "capacity": capacity}
+
+
+def _load_buffer(entry, directory, length):
+    """Memory-map the first length items of a buffer file."""
+    return _map(os.path.join(directory, entry["file"]), entry["dtype"], length)
+
+
+def _append_buffer(entry, values, directory, used, file):
+    """Write values after the first used items of a buffer; returns its new entry.
+
+    They are written in place when they fit the file's capacity and dtype.
+    Otherwise the used items and the values go to a new file with twice the
+    room, in the wider dtype if needed.
+    """
+    dtype = np.dtype(entry["dtype"])
+    values = np.ascontiguousarray(values)
+    if values.dtype == dtype and used + len(values) <= entry["capacity"]:
+        with open(os.path.join(directory, entry["file"]), "r+b") as f:
+            f.seek(used * dtype.itemsize)
+            values.tofile(f)
+        return entry
+    dtype = np.promote_types(dtype, values.dtype)
+    capacity = _capacity(used + len(values))
+    old = _load_buffer(entry, directory, used)
+    with open(os.path.join(directory, file), "wb") as f:
+        for start in range(0, used, 1 << 20):
+            old[start:start + (1 << 20)].astype(dtype, copy=False).tofile(f)
+        values.astype(dtype, copy=False).tofile(f)
+        f.truncate(capacity * dtype.itemsize)
+    return {"file": file, "dtype": dtype.str, "capacity": capacity}
+
+
+def _capacity(n):
+    """Items to allocate a file for when it must hold n: twice as many, so appends rarely copy it."""
+    return max(MIN_CAPACITY, 2 * n)
+
+
+def _replace_meta(directory, old, new):
+    """Write a snapshot's new metadata and delete files neither it nor the old one uses."""
+    _write_json(os.path.join(directory, "meta.json"), new)
+    used = {"meta.json"}
+    for meta in (old, new):
+        used.add(meta["index"]["file"])
+        for col in meta["columns"]:
+            used.update(col[key]["file"] for key in ("values", "codes", "offsets", "data", "valid")
+                        if key in col)
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry not in used and not entry.startswith((".", "indexes-")) and os.path.isfile(path):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+
+def _map(path, dtype, shape):
+    """Memory-map a raw array file read-only (mmap can't map an empty file)."""
+    shape = shape if isinstance(shape, tuple) else (shape,)
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    return np.asarray(np.memmap(path, dtype=dtype, mode="r", shape=shape))
+
+
+def _code_dtype(n_categories):
+    """Smallest signed integer dtype that can hold codes for n categories."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _read_meta(directory, name):
+    """Parse a snapshot's metadata file, or None if it's missing or another format."""
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable snapshot {directory}: {e}")
+        return None
+    return meta if meta.get("format") == SNAPSHOT_FORMAT else None
+
+
+def _write_json(path, value):
+    """Write JSON to path atomically, via a temporary file in the same directory."""
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_directory(directory, write):
+    """Fill a temporary sibling directory with write(tmp_dir) and rename it to directory."""
+    directory = os.fspath(directory)
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        write(tmp_dir)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.rename(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _remove_stale(directory)
+
+
+def _remove_stale(directory):
+    """Delete older snapshots that share this snapshot's name prefix."""
+    parent, name = os.path.split(directory)
+    prefix = name.rsplit("-", 1)[0] + "-"
+    for entry in os.listdir(parent):
+        if entry.startswith(prefix) and entry not in (name, name + ".lock"):
+            path = os.path.join(parent, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
@@ -0,0 +1,127 @@
+"""Server-side paging for the raw data table."""
+import contextlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from snapshot import load_array, save_array
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+class TablePager:
+    """Serves one page of the earthquakes frame at a time.
+
+    Sort orders are computed once per column and direction and shared by
+    every session. With a directory, they are also saved there and
+    memory-mapped, so worker processes sharing the directory sort each
+    column only once between them (once per row count, as events are
+    appended). A page is projected from the frame by
+    position, so only the visible window of rows and columns is ever copied.
+    """
+
+    def __init__(self, earthquakes, directory=None):
+        self._earthquakes = earthquakes
+        self._directory = directory
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    @property
+    def n_rows(self):
+        return len(self._earthquakes)
+
+    def sort_order(self, column, ascending=True):
+        """Row positions sorted by column (stable, missing values last); cached."""
+        key = (column, ascending)
+        order = self._orders.get(key)
+        if order is None:
+            path = self._order_path(column, ascending)
+            order = load_array(path, np.intp, self.n_rows) if path else None
+            if order is None:
+                values = _sort_keys(self._earthquakes[column]).reset_index(drop=True)
+                order = values.sort_values(ascending=ascending, kind="stable",
+                                           na_position="last").index.to_numpy()
+                order.setflags(write=False)
+                # The directory goes away when newer indexes replace it
+                if path and os.path.isdir(self._directory):
+                    try:
+                        save_array(order, path)
+                        self._remove_stale_orders(path)
+                    except OSError as e:
+                        print(f"Could not save the table sort order {path}: {e}")
+            with self._lock:
+                self._orders[key] = order
+        return order
+
+    def _order_path(self, column, ascending):
+        """File for a saved sort order, or None without a directory."""
+        if self._directory is None:
+            return None
+        position = self._earthquakes.columns.get_loc(column)
+        direction = "asc" if ascending else "desc"
+        return os.path.join(self._directory, f"order-{position}-{direction}-{self.n_rows}.bin")
+
+    def _remove_stale_orders(self, path):
+        """Delete saved orders of the same column and direction for other row counts."""
+        prefix = os.path.basename(path).rsplit("-", 1)[0] + "-"
+        for entry in os.listdir(self._directory):
+            if entry.startswith(prefix) and entry != os.path.basename(path):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self._directory, entry))
+
+    def ordered_rows(self, sort=None, ascending=True, rows=None):
+        """Row positions in display order.
+
+        Args:
+            sort: Column to sort by, or None for the original order
+            ascending: Sort direction
+            rows: Sorted row positions of a filter, or None for all rows
+
+        Returns:
+            Array of row positions
+        """
+        if sort is None:
+            return np.arange(self.n_rows) if rows is None else rows
+        order = self.sort_order(sort, ascending)
+        if rows is None:
+            return order
+        member = np.zeros(self.n_rows, dtype=bool)
+        member[rows] = True
+        return order[member[order]]
+
+    def page(self, positions, columns, page, page_size):
+        """Return the DataFrame window of one page.
+
+        Args:
+            positions: Row positions in display order, from ordered_rows
+            columns: Columns to show
+            page: Zero-based page number
+            page_size: Rows per page
+        """
+        start = page * page_size
+        window = positions[start:start + page_size]
+        col_idx = self._earthquakes.columns.get_indexer(columns)
+        return self._earthquakes.iloc[window, col_idx]
+
+
+def page_count(n_rows, page_size):
+    """Number of pages needed for n_rows (at least one)."""
+    return max(1, -(-n_rows // page_size))
+
+
+def _sort_keys(column):
+    """Values to sort a column by.
+
+    Unordered categoricals sort by their values rather than by category
+    order: appended events add new categories at the end, out of
+    alphabetical order.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype) or column.cat.ordered:
+        return column
+    categories = column.cat.categories
+    rank = np.empty(len(categories), dtype=float)
+    rank[categories.argsort()] = np.arange(len(categories))
+    codes = column.cat.codes.to_numpy()
+    return pd.Series(np.where(codes >= 0, rank[codes], np.nan), index=column.index)
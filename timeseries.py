@@ -1,12 +1,26 @@
 """Animated time series visualization for earthquake data."""
 import base64
+import hashlib
 import io
-import matplotlib
-import matplotlib.pyplot as plt
+from pathlib import Path
+
 import numpy as np
-from PIL import Image
+import plotly
+import plotly.graph_objects as go
+
+from cache import DiskCache, LRUCache
+from config import GIF_CACHE_DIR, GIF_CACHE_MB, GIF_DISK_CACHE_MB
+from render_pool import run_in_pool
 
-matplotlib.use("Agg")
+# plotly.js shipped with the plotly package, linked by the page when the
+# browser-side renderer is used
+PLOTLY_JS = Path(plotly.__file__).parent / "package_data" / "plotly.min.js"
+
+# Rendered GIFs keyed by the hash of the series they show, so different
+# filters that produce the same series share one entry
+_gif_cache = LRUCache(GIF_CACHE_MB * 1024 * 1024)
+_gif_disk_cache = (DiskCache(GIF_CACHE_DIR, GIF_DISK_CACHE_MB * 1024 * 1024, suffix=".gif")
+                   if GIF_CACHE_DIR else None)
 
 
 def build_time_series_gif(data, aggregation, metric):
@@ -21,38 +35,167 @@ def build_time_series_gif(data, aggregation, metric):
     Returns:
         Base64 encoded GIF string or None if no data
     """
-    if data.empty:
+    series, ylabel = resample_series(data, aggregation, metric)
+    if series is None:
+        return None
+
+    key = series_digest(series, aggregation, metric)
+    gif = _cached_gif(key, series)
+    if gif is None:
+        gif = _store_gif(key, series, render_series_gif(series, ylabel))
+    return gif
+
+
+async def build_time_series_gif_async(data, aggregation, metric):
+    """Like build_time_series_gif, but renders on the render process pool.
+
+    Resampling and the cache lookups stay in this process; only the series
+    is sent to the pool, and only on a cache miss.
+    """
+    series, ylabel = resample_series(data, aggregation, metric)
+    if series is None:
+        return None
+
+    key = series_digest(series, aggregation, metric)
+    gif = _cached_gif(key, series)
+    if gif is None:
+        gif = _store_gif(key, series, await run_in_pool(render_series_gif, series, ylabel))
+    return gif
+
+
+def _cached_gif(key, series):
+    """Base64 GIF for a series digest from the memory or disk cache, or None."""
+    entry = _gif_cache.get(("gif", key))
+    if entry is not None:
+        return entry[2]
+    gif = _gif_disk_cache.get(key) if _gif_disk_cache else None
+    if gif is None:
+        return None
+    return _store_gif(key, series, gif, to_disk=False)
+
+
+def _store_gif(key, series, gif, to_disk=True):
+    """Cache rendered GIF bytes under a series digest and return them base64 encoded."""
+    if to_disk and _gif_disk_cache:
+        _gif_disk_cache.put(key, gif)
+    entry = (series.index.asi8, series.to_numpy(), base64.b64encode(gif).decode("utf-8"))
+    _gif_cache.put(("gif", key), entry)
+    return entry[2]
+
+
+def build_time_series_figure(data, aggregation, metric):
+    """Build a Plotly figure that animates the time series in the browser.
+
+    Alternative to build_time_series_gif: the aggregated series and its
+    trend line are sent once, and each frame only moves the end of the
+    x-axis range to reveal more of them, so no images are rendered on the
+    server and the payload grows linearly with the series.
+
+    Args:
+        data: DataFrame containing earthquake data with 'datetime' column
+        aggregation: Time aggregation ('Daily', 'Weekly', 'Monthly')
+        metric: Metric to display ('Average Magnitude', 'Max Magnitude',
+                'Earthquake Count')
+
+    Returns:
+        Plotly figure with animation frames, or None if no data
+    """
+    series, ylabel = resample_series(data, aggregation, metric)
+    if series is None:
         return None
 
-    df = data.copy()
-    df = df.sort_values("datetime")
+    dates = series.index.strftime("%Y-%m-%d").tolist()
+    values = series.to_numpy()
+    values = values if metric == "Earthquake Count" else np.round(values, 4)
+    bar_width = (series.index[-1] - series.index[0]) / len(values) * 0.8
+    # Same moving average as the last frame of the GIF's trend line
+    window = min(5, len(values))
+    trend = np.round(np.convolve(values, np.ones(window)/window, mode='same'), 4)
+
+    def frame_range(idx):
+        # At least two points wide, so the first frame's range isn't empty
+        return [dates[0], dates[max(idx, 1)]]
+
+    frame_indices = _frame_indices(len(values))
+    fig = go.Figure(
+        data=[
+            go.Bar(x=dates, y=values.tolist(), marker_color="#3b82f6",
+                   width=bar_width.total_seconds() * 1000, name=ylabel,
+                   hovertemplate="%{x}<br>%{y}<extra></extra>"),
+            go.Scatter(x=dates, y=trend.tolist(), mode="lines", name="Trend",
+                       line=dict(color="#ef4444", width=2.5), hoverinfo="skip"),
+        ],
+        frames=[go.Frame(layout=dict(xaxis=dict(range=frame_range(idx))), name=str(i))
+                for i, idx in enumerate(frame_indices)],
+    )
+    fig.update_layout(
+        xaxis=dict(title="Date", type="date", range=frame_range(frame_indices[0]), tickangle=45),
+        yaxis=dict(title=ylabel, range=[0, float(values.max()) * 1.1], gridcolor="#e5e7eb"),
+        showlegend=False,
+        # A named template would add ~10 KB of styling to every payload
+        template="none",
+        margin={"l": 60, "r": 20, "t": 20, "b": 60},
+        height=400,
+        updatemenus=[dict(
+            type="buttons", showactive=False, x=0, y=1.12, xanchor="left",
+            buttons=[dict(label="▶ Replay", method="animate",
+                          args=[None, {"frame": {"duration": 150, "redraw": True},
+                                       "transition": {"duration": 0},
+                                       "fromcurrent": False}])],
+        )],
+    )
+    return fig
+
 
+def resample_series(data, aggregation, metric):
+    """Aggregate magnitudes over time for the chosen metric.
+
+    Returns:
+        (series, ylabel), where series is None if there are fewer than two
+        points to animate
+    """
     freq_map = {"Daily": "D", "Weekly": "W", "Monthly": "M"}
     freq = freq_map.get(aggregation, "W")
-    df.set_index("datetime", inplace=True)
-
     if metric == "Average Magnitude":
-        series = df["magnitude"].resample(freq).mean()
-        ylabel = "Avg Magnitude"
+        how, ylabel = "mean", "Avg Magnitude"
     elif metric == "Max Magnitude":
-        series = df["magnitude"].resample(freq).max()
-        ylabel = "Max Magnitude"
+        how, ylabel = "max", "Max Magnitude"
     else:
-        series = df["magnitude"].resample(freq).count()
-        ylabel = "Count"
+        how, ylabel = "count", "Count"
+
+    if data.empty:
+        return None, ylabel
+
+    df = data[["datetime", "magnitude"]].sort_values("datetime")
+    df.set_index("datetime", inplace=True)
+    series = getattr(df["magnitude"].resample(freq), how)()
 
     series = series.dropna()
     if len(series) < 2:
-        return None
+        return None, ylabel
+    return series, ylabel
+
+
+def series_digest(series, aggregation, metric):
+    """Content hash of a resampled series and the options it was built with."""
+    digest = hashlib.sha256(f"{aggregation}\n{metric}\n".encode())
+    digest.update(np.ascontiguousarray(series.index.asi8).tobytes())
+    digest.update(np.ascontiguousarray(series.to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()
+
+
+def render_series_gif(series, ylabel):
+    """Render a resampled series as animated GIF bytes."""
+    # matplotlib and PIL are only needed here, and usually only in the
+    # render pool's workers, so the app doesn't import them at start-up
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from PIL import Image
 
     dates = series.index.tolist()
     values = series.values.tolist()
-
-    n_frames = min(len(dates), 20)
-    step = max(1, len(dates) // n_frames)
-    frame_indices = list(range(0, len(dates), step))
-    if frame_indices[-1] != len(dates) - 1:
-        frame_indices.append(len(dates) - 1)
+    frame_indices = _frame_indices(len(dates))
 
     # Calculate bar width based on frequency
     if len(dates) > 1:
@@ -61,31 +204,39 @@ def build_time_series_gif(data, aggregation, metric):
     else:
         bar_width = 1
 
-    frames = []
+    # Axis limits and labels are the same for every frame, so set them up
+    # once and only add the new bars and move the trend line below
     fig, ax = plt.subplots(figsize=(10, 4), dpi=80)
+    ax.set_xlim(dates[0], dates[-1])
+    ax.set_ylim(0, max(values) * 1.1)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel("Date")
+    ax.tick_params(axis="x", rotation=45)
+    trend, = ax.plot(dates[:1], values[:1], color="#ef4444", linewidth=2.5, linestyle='-')
+    trend.set_visible(False)
 
+    frames = []
+    drawn = 0
     for idx in frame_indices:
-        ax.clear()
-        ax.bar(dates[: idx + 1], values[: idx + 1], color="#3b82f6", width=bar_width)
+        ax.bar(dates[drawn: idx + 1], values[drawn: idx + 1], color="#3b82f6", width=bar_width)
+        drawn = idx + 1
 
         if idx > 2:
             # Smooth moving average trend line that follows bar tops
             window = min(5, idx + 1)
             smoothed = np.convolve(values[: idx + 1], np.ones(window)/window, mode='same')
-            ax.plot(dates[: idx + 1], smoothed, color="#ef4444", linewidth=2.5, linestyle='-')
+            trend.set_data(dates[: idx + 1], smoothed)
+            trend.set_visible(True)
 
-        ax.set_xlim(dates[0], dates[-1])
-        ax.set_ylim(0, max(values) * 1.1)
-        ax.set_ylabel(ylabel)
-        ax.set_xlabel("Date")
-        ax.tick_params(axis="x", rotation=45)
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png")
-        buf.seek(0)
-        frames.append(Image.open(buf).copy())
-        buf.close()
+        # The trend line's width can reach past the axes and shift the
+        # layout by a fraction of a pixel, so lay out every frame like
+        # benchmarks/gif_reference.py does
+        fig.tight_layout()
+        # Grab the rendered RGBA buffer directly instead of a PNG round-trip
+        fig.canvas.draw()
+        width, height = fig.canvas.get_width_height()
+        frames.append(Image.frombuffer("RGBA", (width, height), fig.canvas.buffer_rgba(),
+                                       "raw", "RGBA", 0, 1).copy())
 
     plt.close(fig)
 
@@ -98,5 +249,14 @@ def build_time_series_gif(data, aggregation, metric):
         duration=150,
         loop=0,
     )
-    gif_buf.seek(0)
-    return base64.b64encode(gif_buf.read()).decode("utf-8")
+    return gif_buf.getvalue()
+
+
+def _frame_indices(n_points):
+    """Indices of the last point shown in each animation frame."""
+    n_frames = min(n_points, 20)
+    step = max(1, n_points // n_frames)
+    frame_indices = list(range(0, n_points, step))
+    if frame_indices[-1] != n_points - 1:
+        frame_indices.append(n_points - 1)
+    return frame_indices